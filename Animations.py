@@ -0,0 +1,349 @@
+import bisect
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PySide6.QtCore import QElapsedTimer, QObject, QRunnable, QSize, Qt, QTimer, Signal
+from PySide6.QtGui import QImage, QImageReader
+
+from Images import ImageLoader, scaleImage
+
+AnimationKey = Tuple[str, int, int, int]
+
+class AnimationClock(QObject):
+
+    __instance = None
+
+    @staticmethod
+    def instance() -> 'AnimationClock':
+
+        if AnimationClock.__instance is None: AnimationClock.__instance = AnimationClock()
+        return AnimationClock.__instance
+
+    def __init__(self):
+
+        super().__init__()
+        self.ticks = 0
+        self.__animations: Dict[int, object] = {}
+        self.__clock = QElapsedTimer()
+        self.__clock.start()
+
+        self.__timer = QTimer(self)
+        self.__timer.setSingleShot(True)
+        self.__timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.__timer.timeout.connect(self.tick)
+
+    def elapsed(self) -> int:
+
+        return self.__clock.elapsed()
+
+    def add(self, animation):
+
+        self.__animations[id(animation)] = animation
+        self.reschedule()
+
+    def remove(self, animation):
+
+        self.__animations.pop(id(animation), None)
+        if not self.__animations: self.__timer.stop()
+
+    def count(self) -> int:
+
+        return len(self.__animations)
+
+    def tick(self):
+
+        elapsed = self.elapsed()
+        for animation in list(self.__animations.values()): animation.advance(elapsed)
+
+        self.ticks += 1
+        self.reschedule()
+
+    def reschedule(self):
+
+        if not self.__animations: return
+
+        elapsed = self.elapsed()
+        wait = min(animation.msecsToNext(elapsed) for animation in self.__animations.values())
+        self.__timer.start(max(1, wait))
+
+class AnimatedImage:
+
+    # Constants
+    RING_FRAMES = 120
+    PREFETCH_FRAMES = 30
+    DEFAULT_DELAY = 100
+
+    def __init__(self, key: AnimationKey, source: str, size: QSize):
+
+        self.key = key
+        self.source = source
+        self.size = size
+        self.refs = 0
+        self.static = False
+        self.delays: List[int] = []
+        self.index = 0
+
+        self.__ring: OrderedDict[int, QImage] = OrderedDict()
+        self.__ends: List[int] = []
+        self.__reader: Optional[QImageReader] = None
+        self.__readerIndex = 0
+        self.__loading = False
+        self.__last = QImage()
+        self.__subscribers: Dict[int, Callable] = {}
+
+    def isReady(self) -> bool:
+
+        return len(self.delays) > 1
+
+    def frameCount(self) -> int:
+
+        return len(self.delays)
+
+    def duration(self) -> int:
+
+        return self.__ends[-1] if self.__ends else 0
+
+    def setFrames(self, frames: List[QImage], delays: List[int]):
+
+        self.delays = [delay if delay > 0 else self.DEFAULT_DELAY for delay in delays]
+        self.__ends = []
+
+        total = 0
+        for delay in self.delays:
+
+            total += delay
+            self.__ends.append(total)
+
+        for index, frame in enumerate(frames[:self.RING_FRAMES]): self.__ring[index] = frame
+
+    def subscribe(self, key: int, callback: Callable):
+
+        self.__subscribers[key] = callback
+        if self.isReady(): AnimationClock.instance().add(self)
+
+    def unsubscribe(self, key: int):
+
+        self.__subscribers.pop(key, None)
+        if not self.__subscribers: AnimationClock.instance().remove(self)
+
+    def start(self):
+
+        if self.__subscribers: AnimationClock.instance().add(self)
+        self.notify()
+
+    def stop(self):
+
+        AnimationClock.instance().remove(self)
+        self.__subscribers.clear()
+        self.__ring.clear()
+        self.__reader = None
+
+    def notify(self):
+
+        for callback in list(self.__subscribers.values()): callback()
+
+    def frameAt(self, elapsed: int) -> int:
+
+        return min(bisect.bisect_right(self.__ends, elapsed % self.duration()), len(self.delays) - 1)
+
+    def msecsToNext(self, elapsed: int) -> int:
+
+        return self.__ends[self.frameAt(elapsed)] - elapsed % self.duration()
+
+    def advance(self, elapsed: int):
+
+        index = self.frameAt(elapsed)
+        if index == self.index: return
+
+        self.index = index
+        self.prefetch(index)
+        self.notify()
+
+    def current(self) -> QImage:
+
+        return self.frame(self.index)
+
+    def frame(self, index: int) -> QImage:
+
+        frame = self.__ring.get(index)
+
+        # A frame still on its way from the pool is covered by the last one shown
+        if frame is None:
+
+            self.prefetch(index)
+            return self.__last
+
+        self.__ring.move_to_end(index)
+        self.__last = frame
+        return frame
+
+    def prefetch(self, index: int):
+
+        # Frames that fell out of the ring are decoded ahead of playback, never inside paint()
+        if self.__loading or not self.isReady() or len(self.__ring) == self.frameCount(): return
+
+        count = self.frameCount()
+        start = next((other % count for other in range(index, index + self.PREFETCH_FRAMES) if other % count not in self.__ring), None)
+        if start is None: return
+
+        # The sequential reader travels with the task, so only one thread ever touches it
+        self.__loading = True
+        task = AnimationFrameTask(AnimationStore.instance(), self, self.__reader, self.__readerIndex, start, min(self.PREFETCH_FRAMES, count - start))
+        self.__reader = None
+        ImageLoader.instance().pool.start(task)
+
+    def addFrames(self, reader: QImageReader, readerIndex: int, frames: List[Tuple[int, QImage]]):
+
+        self.__loading = False
+        if self.refs == 0: return
+
+        self.__reader = reader
+        self.__readerIndex = readerIndex
+        waiting = self.index not in self.__ring
+
+        for index, frame in frames: self.__ring[index] = frame
+        while len(self.__ring) > self.RING_FRAMES: self.__ring.popitem(last=False)
+
+        if waiting and self.index in self.__ring: self.notify()
+        self.prefetch(self.index)
+
+class AnimationFrameTask(QRunnable):
+
+    def __init__(self, store: 'AnimationStore', animation: AnimatedImage, reader: Optional[QImageReader], readerIndex: int, start: int, count: int):
+
+        super().__init__()
+        self.store = store
+        self.animation = animation
+        self.reader = reader
+        self.readerIndex = readerIndex
+        self.start = start
+        self.count = count
+
+    def run(self):
+
+        reader = self.reader
+        readerIndex = self.readerIndex
+
+        # GIF readers are sequential, so rewind only when looping back
+        if reader is None or self.start < readerIndex:
+
+            reader = QImageReader(self.animation.source)
+            readerIndex = 0
+
+        frames: List[Tuple[int, QImage]] = []
+        while readerIndex < self.start + self.count:
+
+            frame = reader.read()
+            if frame.isNull(): break
+
+            if readerIndex >= self.start: frames.append((readerIndex, scaleImage(frame, self.animation.size)))
+            readerIndex += 1
+
+        self.store.framesDecoded.emit(self.animation, (reader, readerIndex, frames))
+
+class AnimationDecodeTask(QRunnable):
+
+    def __init__(self, store: 'AnimationStore', animation: AnimatedImage):
+
+        super().__init__()
+        self.store = store
+        self.animation = animation
+
+    def run(self):
+
+        # Telling a still image from an animation can parse the whole file, so it is done here, not on the GUI thread
+        probe = QImageReader(self.animation.source)
+        if not probe.supportsAnimation() or probe.imageCount() == 1:
+
+            self.store.decoded.emit(self.animation, None, None)
+            return
+
+        reader = QImageReader(self.animation.source)
+        frames: List[QImage] = []
+        delays: List[int] = []
+
+        while True:
+
+            frame = reader.read()
+            if frame.isNull(): break
+
+            delays.append(reader.nextImageDelay())
+            if len(frames) < AnimatedImage.RING_FRAMES: frames.append(scaleImage(frame, self.animation.size))
+
+        self.store.decoded.emit(self.animation, frames, delays)
+
+class AnimationStore(QObject):
+
+    decoded = Signal(object, object, object)
+    framesDecoded = Signal(object, object)
+
+    __instance = None
+
+    @staticmethod
+    def instance() -> 'AnimationStore':
+
+        if AnimationStore.__instance is None: AnimationStore.__instance = AnimationStore()
+        return AnimationStore.__instance
+
+    def __init__(self):
+
+        super().__init__()
+        self.__animations: Dict[AnimationKey, AnimatedImage] = {}
+        self.__animated: Dict[str, Tuple[int, bool]] = {}
+        self.decoded.connect(self.onDecoded, Qt.ConnectionType.QueuedConnection)
+        self.framesDecoded.connect(self.onFramesDecoded, Qt.ConnectionType.QueuedConnection)
+
+    def acquire(self, source: str, size: QSize) -> Optional[AnimatedImage]:
+
+        try: stamp = os.stat(source).st_mtime_ns
+        except OSError: return None
+
+        # Until the decode task has looked at a source, it is treated as possibly animated
+        if self.__animated.get(source) == (stamp, False): return None
+
+        key = (source, stamp, size.width(), size.height())
+        animation = self.__animations.get(key)
+
+        if animation is None:
+
+            animation = AnimatedImage(key, source, size)
+            self.__animations[key] = animation
+            ImageLoader.instance().pool.start(AnimationDecodeTask(self, animation))
+
+        animation.refs += 1
+        return animation
+
+    def release(self, animation: Optional[AnimatedImage], key: int):
+
+        if animation is None: return
+
+        animation.unsubscribe(key)
+        animation.refs -= 1
+        if animation.refs > 0: return
+
+        animation.stop()
+        if self.__animations.get(animation.key) is animation: del self.__animations[animation.key]
+
+    def count(self) -> int:
+
+        return len(self.__animations)
+
+    def onDecoded(self, animation: AnimatedImage, frames: Optional[List[QImage]], delays: Optional[List[int]]):
+
+        self.__animated[animation.source] = (animation.key[1], frames is not None)
+        if animation.refs == 0: return
+
+        # Holders of a still image drop it and go back to the plain image path
+        if frames is None:
+
+            animation.static = True
+            animation.notify()
+            return
+
+        animation.setFrames(frames, delays)
+        if animation.isReady(): animation.start()
+
+    def onFramesDecoded(self, animation: AnimatedImage, result: Tuple[QImageReader, int, List[Tuple[int, QImage]]]):
+
+        animation.addFrames(*result)
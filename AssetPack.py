@@ -0,0 +1,239 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PySide6.QtCore import QSize
+from PySide6.QtGui import QImage
+
+from Images import contentDigest, scaleImage
+
+class AssetPackError(Exception):
+
+    pass
+
+class AssetPackEntry:
+
+    def __init__(self, record: dict):
+
+        self.source: str = record['source']
+        self.width: int = record['width']
+        self.height: int = record['height']
+        self.bytesPerLine: int = record['bytesPerLine']
+        self.offset: int = record['offset']
+        self.digest: str = record['digest']
+        self.stamp: Tuple[int, int] = tuple(record['stamp'])
+
+    def record(self) -> dict:
+
+        return {
+
+            'source': self.source,
+            'width': self.width,
+            'height': self.height,
+            'bytesPerLine': self.bytesPerLine,
+            'offset': self.offset,
+            'digest': self.digest,
+            'stamp': list(self.stamp)
+        }
+
+class AssetPack:
+
+    # Constants
+    MAGIC = b'ELPK'
+    VERSION = 1
+    EXTENSION = '.elpk'
+    HEADER = struct.Struct('<4sIQQ')
+    ALIGNMENT = 64
+    FORMAT = QImage.Format.Format_ARGB32_Premultiplied
+
+    def __init__(self, path: str):
+
+        self.path = path
+        self.__file = open(path, 'rb')
+        self.__map = None
+
+        try: self.__entries = self.readIndex()
+        except Exception:
+
+            # A pack that fails to load must not keep its file open or mapped
+            if self.__map is not None: self.__map.close()
+            self.__file.close()
+            raise
+
+    def readIndex(self) -> Dict[Tuple[str, int, int], AssetPackEntry]:
+
+        try:
+
+            self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, indexOffset, indexLength = self.HEADER.unpack_from(self.__map, 0)
+
+        except (ValueError, struct.error): magic, version = None, 0
+
+        if magic != self.MAGIC: raise AssetPackError('{} is not an asset pack'.format(self.path))
+        if version > self.VERSION: raise AssetPackError('{} was written by a newer version (pack v{})'.format(self.path, version))
+
+        entries = {}
+
+        try:
+
+            index = json.loads(bytes(self.__map[indexOffset:indexOffset + indexLength]))
+
+            for record in index['entries']:
+
+                entry = AssetPackEntry(record)
+                entries[(entry.source, entry.width, entry.height)] = entry
+
+        except (KeyError, TypeError, ValueError) as e: raise AssetPackError('{} has a damaged index: {}'.format(self.path, e))
+
+        return entries
+
+    @staticmethod
+    def pathFor(layoutPath: str) -> str:
+
+        return os.path.splitext(layoutPath)[0] + AssetPack.EXTENSION
+
+    @staticmethod
+    def forLayout(layoutPath: str) -> Optional['AssetPack']:
+
+        path = AssetPack.pathFor(layoutPath)
+        if not os.path.exists(path): return None
+
+        try: return AssetPack(path)
+        except (OSError, AssetPackError): return None
+
+    def entries(self) -> List[AssetPackEntry]:
+
+        return list(self.__entries.values())
+
+    def find(self, source: str, size: QSize) -> Optional[AssetPackEntry]:
+
+        entry = self.__entries.get((source, size.width(), size.height()))
+        if entry is None: return None
+
+        # A source edited after packing wins over the packed pixels
+        try: stat = os.stat(source)
+        except OSError: return entry
+
+        return entry if (stat.st_mtime_ns, stat.st_size) == entry.stamp else None
+
+    def image(self, entry: AssetPackEntry) -> QImage:
+
+        length = entry.bytesPerLine * entry.height
+        view = memoryview(self.__map)[entry.offset:entry.offset + length]
+        return QImage(view, entry.width, entry.height, entry.bytesPerLine, self.FORMAT)
+
+    @staticmethod
+    def write(path: str, assets: Iterable[Tuple[str, int, int]]) -> int:
+
+        entries: List[AssetPackEntry] = []
+        temp = path + '.tmp'
+
+        with open(temp, 'wb') as file:
+
+            file.write(b'\0' * AssetPack.ALIGNMENT)
+
+            for source, width, height in sorted(set(assets)):
+
+                try:
+
+                    stat = os.stat(source)
+                    with open(source, 'rb') as asset: data = asset.read()
+
+                except OSError: continue
+
+                image = QImage.fromData(data)
+                if image.isNull(): continue
+
+                image = scaleImage(image, QSize(width, height)).convertToFormat(AssetPack.FORMAT)
+                offset = AssetPack.align(file)
+                file.write(bytes(image.constBits()))
+
+                entries.append(AssetPackEntry({
+
+                    'source': source,
+                    'width': width,
+                    'height': height,
+                    'bytesPerLine': image.bytesPerLine(),
+                    'offset': offset,
+                    'digest': contentDigest(data),
+                    'stamp': [stat.st_mtime_ns, stat.st_size]
+                }))
+
+            index = json.dumps({'entries': [entry.record() for entry in entries]}).encode('utf-8')
+            indexOffset = AssetPack.align(file)
+            file.write(index)
+
+            file.seek(0)
+            file.write(AssetPack.HEADER.pack(AssetPack.MAGIC, AssetPack.VERSION, indexOffset, len(index)))
+
+        os.replace(temp, path)
+        return len(entries)
+
+    @staticmethod
+    def align(file) -> int:
+
+        offset = file.tell()
+        padding = -offset % AssetPack.ALIGNMENT
+        if padding: file.write(b'\0' * padding)
+
+        return offset + padding
+
+    def unpack(self, directory: str) -> int:
+
+        os.makedirs(directory, exist_ok=True)
+
+        for number, entry in enumerate(self.entries()):
+
+            name = '{:04d}_{}_{}x{}.png'.format(number, os.path.splitext(os.path.basename(entry.source))[0], entry.width, entry.height)
+            self.image(entry).save(os.path.join(directory, name))
+
+        return len(self.__entries)
+
+def layoutAssets(layoutPath: str) -> List[Tuple[str, int, int]]:
+
+    from Layouts import LayoutFile
+
+    return [(item.source, item.width, item.height) for item in LayoutFile(layoutPath).read() if item.source != '']
+
+def main(argv: List[str]) -> int:
+
+    parser = argparse.ArgumentParser(prog='AssetPack', description='Pack or unpack the images used by an Elayvate layout.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    pack = commands.add_parser('pack', help='write a pack next to a layout')
+    pack.add_argument('layout')
+    pack.add_argument('-o', '--output')
+
+    unpack = commands.add_parser('unpack', help='extract a pack to PNG files')
+    unpack.add_argument('pack')
+    unpack.add_argument('directory')
+
+    args = parser.parse_args(argv)
+
+    try:
+
+        if args.command == 'pack':
+
+            output = args.output or AssetPack.pathFor(args.layout)
+            count = AssetPack.write(output, layoutAssets(args.layout))
+            print('Packed {} images into {}'.format(count, output))
+
+        else:
+
+            count = AssetPack(args.pack).unpack(args.directory)
+            print('Unpacked {} images into {}'.format(count, args.directory))
+
+    except (OSError, ValueError, AssetPackError) as e:
+
+        print(e, file=sys.stderr)
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,257 @@
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from PySide6.QtCore import QRectF, qVersion
+from PySide6.QtGui import QImage, QPainter
+from PySide6.QtWidgets import QApplication, QStyleOptionGraphicsItem
+
+from Globals import Math
+from Items import ScreenPreviewItem
+
+class BenchmarkCase:
+
+    def __init__(self, name: str, run: Callable, setup: Callable = None, teardown: Callable = None, repeat: int = 5):
+
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.teardown = teardown
+        self.repeat = repeat
+
+    def measure(self) -> Dict[str, float]:
+
+        samples: List[float] = []
+
+        for _ in range(self.repeat):
+
+            state = self.setup() if self.setup is not None else None
+            start = time.perf_counter()
+            self.run(state)
+            samples.append((time.perf_counter() - start) * 1000)
+            if self.teardown is not None: self.teardown(state)
+
+        return {
+
+            'median_ms': round(statistics.median(samples), 4),
+            'min_ms': round(min(samples), 4),
+            'max_ms': round(max(samples), 4),
+            'runs': len(samples)
+        }
+
+class BenchmarkSuite:
+
+    # Constants
+    ITEM_COUNTS = (1, 100, 1000, 10000)
+    STORM_SIZE = 1000
+    RESOLUTIONS = {'1080p': (1920, 1080), '1440p': (2560, 1440), '4k': (3840, 2160), 'ultrawide': (3440, 1440)}
+    OVERLAY_COUNTS = (100, 1000)
+    VIEW_SIZE = (1280, 720)
+
+    def __init__(self, app: QApplication):
+
+        import main
+
+        self.app = app
+        self.main = main
+        self.cases: List[BenchmarkCase] = []
+        self.windows = []
+        self.createCases()
+
+    def newWindows(self):
+
+        overlay = self.main.ElayvateOverlay()
+        window = self.main.ElayvateWindow(overlay)
+        window.ensureEditorUi()
+        window.overlayFrame.view.resize(*self.VIEW_SIZE)
+        self.windows.append((overlay, window))
+        return overlay, window
+
+    def populate(self, count: int):
+
+        overlay, window = self.newWindows()
+        for _ in range(count): window.overlayFrame.addItem()
+
+        width = window.overlayFrame.screenPreviewItem.width
+        for i, proxy in enumerate(window.proxies): proxy.setX(i * 37 % width)
+
+        self.app.processEvents()
+        return overlay, window
+
+    def dispose(self, state):
+
+        overlay, window = state
+        window.clearLayout()
+        window.deleteLater()
+        for overlayWindow in overlay.windows(): overlayWindow.deleteLater()
+        overlay.deleteLater()
+        self.windows.remove(state)
+        self.app.processEvents()
+
+    def render(self, view):
+
+        image = QImage(view.viewport().size(), QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(0)
+        painter = QPainter(image)
+        view.render(painter)
+        painter.end()
+
+    def renderOverlay(self, overlay):
+
+        # Goes through the viewport's paint event so the composite is what gets measured
+        viewport = overlay.windows()[0].view.viewport()
+        image = QImage(viewport.size(), QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(0)
+        viewport.render(image)
+
+    def createCases(self):
+
+        for count in self.ITEM_COUNTS:
+
+            self.cases.append(BenchmarkCase(
+
+                'add_items_{}'.format(count),
+                lambda state, count=count: [state[1].overlayFrame.addItem() for _ in range(count)],
+                self.newWindows, self.dispose, repeat=3 if count >= 1000 else 5
+            ))
+
+        self.cases.append(BenchmarkCase('selection_storm_{}'.format(self.STORM_SIZE), self.selectionStorm, lambda: self.populate(self.STORM_SIZE), self.dispose))
+        self.cases.append(BenchmarkCase('change_storm_{}'.format(self.STORM_SIZE), self.changeStorm, lambda: self.populate(self.STORM_SIZE), self.dispose))
+
+        for name, (width, height) in self.RESOLUTIONS.items():
+
+            self.cases.append(BenchmarkCase('screen_preview_{}'.format(name), lambda _, width=width, height=height: self.screenPreview(width, height)))
+
+        self.cases.append(BenchmarkCase('zoom_pan', self.zoomPan, lambda: self.populate(100), self.dispose))
+
+        for count in self.OVERLAY_COUNTS:
+
+            self.cases.append(BenchmarkCase('overlay_repaint_{}'.format(count), lambda state: [self.renderOverlay(state[0]) for _ in range(10)], lambda count=count: self.populate(count), self.dispose))
+
+    def selectionStorm(self, state):
+
+        _, window = state
+
+        for proxy in window.proxies:
+
+            window.onPreviewSelectionChanged([proxy.previewGraphicsItem()])
+            window.onPreviewSelectionChanged([])
+
+    def changeStorm(self, state):
+
+        _, window = state
+        for proxy in window.proxies: window.onPreviewItemChanged(proxy.previewGraphicsItem())
+
+    def screenPreview(self, width: int, height: int):
+
+        item = ScreenPreviewItem(width, height, Math.toCellSize(width + height))
+        image = QImage(*self.VIEW_SIZE, QImage.Format.Format_ARGB32_Premultiplied)
+        scale = self.VIEW_SIZE[0] / width
+
+        painter = QPainter(image)
+        painter.scale(scale, scale)
+        option = QStyleOptionGraphicsItem()
+        option.exposedRect = QRectF(0, 0, width, height)
+        item.grid.paint(painter, option, None)
+        painter.end()
+
+    def zoomPan(self, state):
+
+        _, window = state
+        frame = window.overlayFrame
+        frame.fitScreen()
+
+        for _ in range(5):
+
+            frame.zoomIn()
+            self.render(frame.view)
+
+        for offset in range(0, 200, 20):
+
+            frame.view.horizontalScrollBar().setValue(offset)
+            frame.view.verticalScrollBar().setValue(offset)
+            self.render(frame.view)
+
+        for _ in range(10):
+
+            frame.zoomOut()
+            self.render(frame.view)
+
+    def run(self, only: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+
+        results = {}
+
+        for case in self.cases:
+
+            if only is not None and only not in case.name: continue
+            results[case.name] = case.measure()
+            print('{:<28} {:>12.3f} ms'.format(case.name, results[case.name]['median_ms']), file=sys.stderr)
+
+        return results
+
+def metadata() -> Dict[str, str]:
+
+    return {
+
+        'python': platform.python_version(),
+        'qt': qVersion(),
+        'platform': platform.platform(),
+        'qpa': os.environ.get('QT_QPA_PLATFORM', '')
+    }
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+
+    regressions = []
+
+    for name, result in results.items():
+
+        base = baseline.get(name)
+        if base is None or base['median_ms'] <= 0: continue
+
+        ratio = result['median_ms'] / base['median_ms']
+        result['baseline_ms'] = base['median_ms']
+        result['ratio'] = round(ratio, 3)
+
+        if ratio > 1 + threshold: regressions.append('{}: {:.3f} ms vs {:.3f} ms ({:+.0%})'.format(name, result['median_ms'], base['median_ms'], ratio - 1))
+
+    return regressions
+
+def main(argv: List[str]) -> int:
+
+    parser = argparse.ArgumentParser(prog='Benchmarks', description='Headless benchmarks for the Elayvate editor and overlay.')
+    parser.add_argument('-o', '--output', help='write results as JSON to this file instead of stdout')
+    parser.add_argument('-c', '--compare', help='baseline JSON to compare against')
+    parser.add_argument('-t', '--threshold', type=float, default=0.2, help='allowed slowdown before flagging a regression (default 0.2)')
+    parser.add_argument('-k', '--filter', help='only run benchmarks whose name contains this')
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication([])
+    results = BenchmarkSuite(app).run(args.filter)
+    report = {'meta': metadata(), 'results': results}
+    regressions = []
+
+    if args.compare is not None:
+
+        with open(args.compare, 'r', encoding='utf-8') as file: baseline = json.load(file)
+        regressions = compare(results, baseline.get('results', {}), args.threshold)
+        report['regressions'] = regressions
+
+    output = json.dumps(report, indent=4)
+
+    if args.output is None: print(output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file: file.write(output + '\n')
+
+    for regression in regressions: print('REGRESSION ' + regression, file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+
+    sys.exit(main(sys.argv[1:]))
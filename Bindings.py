@@ -0,0 +1,172 @@
+import json
+from typing import Dict, List, Optional, Tuple, Union
+
+from PySide6.QtCore import QObject, Qt
+
+from DataSources import DataHub, DataKey, DataSource, JsonFileSource, PipeSource, UdpSource
+from Models import OverlayItemProxy, OverlayItemRegistry
+from Scheduling import OverlayUpdateScheduler
+from Texts import TextStore
+
+class BindingError(ValueError):
+
+    pass
+
+def isTruthy(value) -> bool:
+
+    if isinstance(value, str): return value.strip().lower() not in ('', '0', 'false', 'off', 'no', 'hidden')
+    return bool(value)
+
+class DataBinding:
+
+    # Constants
+    PROPERTIES = ('text', 'visible', 'image')
+
+    def __init__(self, item: Union[int, str], property: str, source: str, key: str, format: str = '{}'):
+
+        if property not in self.PROPERTIES: raise BindingError('unknown property {!r}'.format(property))
+
+        self.item = item
+        self.property = property
+        self.source = source
+        self.key = key
+        self.format = format
+
+    def resolve(self, proxies: OverlayItemRegistry, names: Optional[Dict[str, OverlayItemProxy]]) -> Optional[OverlayItemProxy]:
+
+        if isinstance(self.item, int): return proxies.byId(self.item)
+        return names.get(self.item)
+
+    def apply(self, proxy: OverlayItemProxy, value):
+
+        if self.property == 'visible':
+
+            proxy.setVisible(isTruthy(value))
+            return
+
+        # Incoming text is data, never template: a sender must not be able to inject {file:...} fields
+        if self.property == 'text': value = TextStore.escape(str(value))
+
+        try: source = self.format.format(value)
+        except (IndexError, KeyError, ValueError): source = str(value)
+
+        if self.property == 'text': source = TextStore.SCHEME + source
+        if source != proxy.source(): proxy.setSource(source)
+
+class DataBinder(QObject):
+
+    # Constants
+    SOURCE_TYPES = ('json', 'pipe', 'udp')
+
+    def __init__(self, proxies: OverlayItemRegistry):
+
+        super().__init__()
+        self.proxies = proxies
+        self.applied = 0
+        self.__bindings: Dict[DataKey, List[DataBinding]] = {}
+        self.__dirty: Dict[int, Tuple[DataBinding, object]] = {}
+        DataHub.instance().changed.connect(self.onChanged, Qt.ConnectionType.QueuedConnection)
+
+    def load(self, path: str):
+
+        try:
+            with open(path, 'r', encoding='utf-8') as file: config = json.load(file)
+        except ValueError as e: raise BindingError('{}: {}'.format(path, e))
+
+        if not isinstance(config, dict): raise BindingError('{}: expected an object'.format(path))
+
+        sources = config.get('sources', {})
+        specs = config.get('bindings', [])
+        if not isinstance(sources, dict): raise BindingError('{}: sources must be an object'.format(path))
+        if not isinstance(specs, list): raise BindingError('{}: bindings must be a list'.format(path))
+
+        # Everything is checked before the first source starts, so a bad file changes nothing
+        created = [self.createSource(name, spec) for name, spec in sources.items()]
+        bindings = [self.createBinding(path, spec) for spec in specs]
+
+        hub = DataHub.instance()
+        for source in created: hub.addSource(source)
+        for binding in bindings: self.add(binding)
+
+        self.refresh()
+
+    def createSource(self, name: str, spec: dict) -> DataSource:
+
+        if not isinstance(spec, dict): raise BindingError('source {}: expected an object'.format(name))
+        kind = spec.get('type')
+
+        for field in ('path', 'host'):
+            if field in spec and not isinstance(spec[field], str): raise BindingError('source {}: {} must be a string'.format(name, field))
+
+        try:
+
+            if kind == 'json': return JsonFileSource(name, spec['path'], float(spec.get('interval', JsonFileSource.POLL_SECONDS)))
+            if kind == 'pipe': return PipeSource(name, spec['path'])
+            if kind == 'udp': return UdpSource(name, int(spec['port']), spec.get('host', UdpSource.HOST))
+
+        except (KeyError, TypeError, ValueError) as e: raise BindingError('source {}: {}'.format(name, e))
+
+        raise BindingError('source {}: type must be one of {}'.format(name, ', '.join(self.SOURCE_TYPES)))
+
+    def createBinding(self, path: str, spec: dict) -> DataBinding:
+
+        if not isinstance(spec, dict): raise BindingError('{}: bad binding {!r}: expected an object'.format(path, spec))
+
+        item, property, source, key, format = (spec.get(field) for field in ('item', 'property', 'source', 'key', 'format'))
+        if format is None: format = '{}'
+
+        if not isinstance(item, (int, str)) or isinstance(item, bool): raise BindingError('{}: bad binding {!r}: item must be an id or a name'.format(path, spec))
+        for field, value in (('property', property), ('source', source), ('key', key), ('format', format)):
+            if not isinstance(value, str): raise BindingError('{}: bad binding {!r}: {} must be a string'.format(path, spec, field))
+
+        return DataBinding(item, property, source, key, format)
+
+    def add(self, binding: DataBinding):
+
+        self.__bindings.setdefault((binding.source, binding.key), []).append(binding)
+
+    def clear(self):
+
+        self.__bindings.clear()
+        self.__dirty.clear()
+        OverlayUpdateScheduler.instance().cancel(id(self))
+
+    def count(self) -> int:
+
+        return sum(len(bindings) for bindings in self.__bindings.values())
+
+    def refresh(self):
+
+        # Push the last known values, e.g. onto items from a freshly loaded layout
+        self.mark(DataHub.instance().values())
+
+    def onChanged(self):
+
+        self.mark(DataHub.instance().take())
+
+    def mark(self, values: Dict[DataKey, object]):
+
+        for key, value in values.items():
+            for binding in self.__bindings.get(key, ()): self.__dirty[id(binding)] = (binding, value)
+
+        # However fast sources write, items see at most one change per overlay frame
+        if self.__dirty: OverlayUpdateScheduler.instance().schedule(id(self), self.flush)
+
+    def flush(self):
+
+        dirty, self.__dirty = self.__dirty, {}
+        names = None
+
+        for binding, value in dirty.values():
+
+            # Name lookups share one index per flush instead of scanning every item per binding
+            if names is None and not isinstance(binding.item, int):
+
+                names = {}
+                for proxy in self.proxies: names.setdefault(proxy.name(), proxy)
+
+            proxy = binding.resolve(self.proxies, names)
+            if proxy is None: continue
+
+            binding.apply(proxy, value)
+            self.applied += 1
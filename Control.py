@@ -0,0 +1,206 @@
+import asyncio
+import json
+import os
+import socket
+import stat
+import sys
+import threading
+from typing import Dict, List, Optional
+
+from PySide6.QtCore import QObject, Qt, Signal
+
+from ControlClient import ItemRef, defaultSocketPath
+from DataSources import DataHub
+from Models import OverlayItemProxy, OverlayItemRegistry
+from Scheduling import OverlayUpdateScheduler
+
+Update = List[object]
+
+class ControlServer(QObject):
+
+    # Signals
+    received = Signal()
+
+    # Constants
+    FIELDS = ('id', 'x', 'y', 'visible', 'source')
+    LINE_LIMIT = 4 * 1024 * 1024
+    HIGH_WATER = 20000
+
+    def __init__(self, proxies: OverlayItemRegistry, path: str = None):
+
+        super().__init__()
+        self.proxies = proxies
+        self.path = path or defaultSocketPath()
+        self.commands = 0
+        self.batches = 0
+        self.applied = 0
+        self.flushes = 0
+        self.__task = None
+        self.__room: Optional[asyncio.Event] = None
+        self.__pending: Dict[ItemRef, Update] = {}
+        self.__queued = 0
+        self.__posted = False
+        self.__lock = threading.Lock()
+        self.received.connect(self.onReceived, Qt.ConnectionType.QueuedConnection)
+
+    def start(self):
+
+        self.__task = DataHub.instance().submit(self.serve())
+
+    async def serve(self):
+
+        self.removeSocket()
+        self.__room = asyncio.Event()
+
+        # Owner-only from the moment the node exists; the umask is process-wide, so it is left alone
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        try:
+
+            os.fchmod(sock.fileno(), 0o600)
+            sock.bind(self.path)
+            server = await asyncio.start_unix_server(self.onClient, sock=sock, limit=self.LINE_LIMIT)
+
+        except OSError as e:
+
+            sock.close()
+            print('Control socket not started: {}'.format(e), file=sys.stderr)
+            return
+
+        try:
+            async with server: await server.serve_forever()
+        except asyncio.CancelledError: raise
+        except Exception as e: print('Control socket stopped: {}'.format(e), file=sys.stderr)
+        finally: self.removeSocket()
+
+    def removeSocket(self):
+
+        # Only a stale socket is cleared; a regular file or directory at the path is left alone
+        try:
+            if stat.S_ISSOCK(os.lstat(self.path).st_mode): os.remove(self.path)
+        except FileNotFoundError: pass
+
+    async def onClient(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+
+        try:
+
+            while True:
+
+                try: line = await reader.readline()
+                except ValueError: line = None
+
+                if line == b'': break
+
+                writer.write((json.dumps(self.accept(line)) + '\n').encode())
+                await writer.drain()
+
+                # Not reading the next batch until the GUI catches up is what pushes back on clients
+                while self.backlog() > self.HIGH_WATER:
+
+                    self.__room.clear()
+                    await self.__room.wait()
+
+        except (ConnectionError, asyncio.CancelledError): pass
+        finally: writer.close()
+
+    def accept(self, line: Optional[bytes]) -> Dict:
+
+        if line is None: return {'error': 'batch larger than {} bytes'.format(self.LINE_LIMIT)}
+
+        try: request = json.loads(line)
+        except ValueError as e: return {'error': 'bad JSON: {}'.format(e)}
+
+        if not isinstance(request, dict): return {'error': 'expected an object'}
+
+        seq = request.get('seq')
+        try: updates = [self.parse(update) for update in request.get('items', [])]
+        except (TypeError, ValueError) as e: return {'seq': seq, 'error': str(e)}
+
+        self.queue(updates)
+        return {'seq': seq, 'queued': len(updates)}
+
+    def parse(self, update) -> Update:
+
+        if isinstance(update, dict): update = [update.get(field) for field in self.FIELDS]
+        if not isinstance(update, list) or not 1 <= len(update) <= len(self.FIELDS): raise ValueError('update must be (id, x, y, visible, source)')
+
+        update = update + [None] * (len(self.FIELDS) - len(update))
+        id, x, y, visible, source = update
+
+        if not isinstance(id, (int, str)) or isinstance(id, bool): raise ValueError('bad item id {!r}'.format(id))
+        for value in (x, y):
+            if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool)): raise ValueError('bad position {!r}'.format(value))
+        if visible is not None and not isinstance(visible, bool): raise ValueError('bad visible {!r}'.format(visible))
+        if source is not None and not isinstance(source, str): raise ValueError('bad source {!r}'.format(source))
+
+        return update
+
+    def queue(self, updates: List[Update]):
+
+        # Later updates to the same item overwrite earlier ones field by field
+        with self.__lock:
+
+            for update in updates:
+
+                pending = self.__pending.get(update[0])
+                if pending is None: self.__pending[update[0]] = update
+                else:
+                    for index in range(1, len(update)):
+                        if update[index] is not None: pending[index] = update[index]
+
+            self.__queued += len(updates)
+            self.commands += len(updates)
+            self.batches += 1
+            if self.__posted: return
+            self.__posted = True
+
+        self.received.emit()
+
+    def backlog(self) -> int:
+
+        return self.__queued
+
+    def onReceived(self):
+
+        OverlayUpdateScheduler.instance().schedule(id(self), self.flush)
+
+    def take(self) -> Dict[ItemRef, Update]:
+
+        with self.__lock:
+
+            pending, self.__pending = self.__pending, {}
+            self.__queued = 0
+            self.__posted = False
+
+        if self.__room is not None: DataHub.instance().callSoon(self.__room.set)
+        return pending
+
+    def flush(self):
+
+        # Everything that arrived since the last frame lands in this one pass
+        pending = self.take()
+        if not pending: return
+
+        names = None
+
+        for ref, (_, x, y, visible, source) in pending.items():
+
+            if isinstance(ref, int): proxy = self.proxies.byId(ref)
+            else:
+
+                if names is None: names = {proxy.name(): proxy for proxy in self.proxies}
+                proxy = names.get(ref)
+
+            if proxy is None: continue
+
+            self.apply(proxy, x, y, visible, source)
+            self.applied += 1
+
+        self.flushes += 1
+
+    def apply(self, proxy: OverlayItemProxy, x: Optional[float], y: Optional[float], visible: Optional[bool], source: Optional[str]):
+
+        if x is not None and x != proxy.x(): proxy.setX(x)
+        if y is not None and y != proxy.y(): proxy.setY(y)
+        if visible is not None: proxy.setVisible(visible)
+        if source is not None and source != proxy.source(): proxy.setSource(source)
@@ -0,0 +1,174 @@
+import argparse
+import json
+import math
+import os
+import socket
+import sys
+import tempfile
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+ItemRef = Union[int, str]
+
+def defaultSocketPath() -> str:
+
+    return os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(), 'elayvate.sock')
+
+class ControlError(RuntimeError):
+
+    pass
+
+class ControlClient:
+
+    # Constants
+    WINDOW = 8
+    BUFFER_SIZE = 65536
+
+    def __init__(self, path: str = None, window: int = WINDOW):
+
+        self.path = path or defaultSocketPath()
+        self.window = window
+        self.sent = 0
+        self.acked = 0
+        self.__seq = 0
+        self.__inFlight = deque()
+        self.__buffer = b''
+        self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__socket.connect(self.path)
+
+    def __enter__(self) -> 'ControlClient':
+
+        return self
+
+    def __exit__(self, *_):
+
+        self.close()
+
+    def close(self):
+
+        if self.__socket is None: return
+
+        try: self.flush()
+        finally:
+
+            self.__socket.close()
+            self.__socket = None
+
+    def update(self, item: ItemRef, x: float = None, y: float = None, visible: bool = None, source: str = None) -> int:
+
+        return self.send([(item, x, y, visible, source)])
+
+    def send(self, updates: Iterable[Sequence]) -> int:
+
+        # Each update is (item, x, y, visible, source); None leaves a field as it is
+        updates = [list(update) for update in updates]
+        self.__seq += 1
+
+        # Only a few batches may be unacknowledged, so a busy overlay slows the sender down
+        while len(self.__inFlight) >= self.window: self.receive()
+
+        self.__socket.sendall((json.dumps({'seq': self.__seq, 'items': updates}) + '\n').encode())
+        self.__inFlight.append((self.__seq, len(updates)))
+        self.sent += len(updates)
+        return self.__seq
+
+    def flush(self):
+
+        while self.__inFlight: self.receive()
+
+    def receive(self) -> Dict:
+
+        while b'\n' not in self.__buffer:
+
+            data = self.__socket.recv(self.BUFFER_SIZE)
+            if not data: raise ControlError('connection closed by the overlay')
+            self.__buffer += data
+
+        line, self.__buffer = self.__buffer.split(b'\n', 1)
+        reply = json.loads(line)
+        _, count = self.__inFlight.popleft()
+
+        if 'error' in reply: raise ControlError('batch {}: {}'.format(reply.get('seq'), reply['error']))
+
+        self.acked += count
+        return reply
+
+def loadTest(path: Optional[str], items: List[ItemRef], batch: int, seconds: float, window: int) -> Dict[str, float]:
+
+    client = ControlClient(path, window)
+    started = time.perf_counter()
+    frame = 0
+
+    while time.perf_counter() - started < seconds:
+
+        # Every item walks a small circle so each command really moves something
+        updates = []
+        for index in range(batch):
+
+            item = items[(frame * batch + index) % len(items)]
+            angle = (frame + index) / 10
+            updates.append((item, 200 + math.cos(angle) * 100, 200 + math.sin(angle) * 100, None, None))
+
+        client.send(updates)
+        frame += 1
+
+    client.close()
+    elapsed = time.perf_counter() - started
+
+    return {
+
+        'commands': client.acked,
+        'batches': frame,
+        'seconds': round(elapsed, 3),
+        'commands_per_second': round(client.acked / elapsed, 1)
+    }
+
+def main(argv: List[str]) -> int:
+
+    parser = argparse.ArgumentParser(prog='ControlClient', description='Drive a running Elayvate overlay over its control socket.')
+    parser.add_argument('-s', '--socket', help='control socket path (default {})'.format(defaultSocketPath()))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    update = commands.add_parser('update', help='change one item')
+    update.add_argument('item', help='item id or name')
+    update.add_argument('--x', type=float)
+    update.add_argument('--y', type=float)
+    update.add_argument('--show', dest='visible', action='store_true', default=None)
+    update.add_argument('--hide', dest='visible', action='store_false')
+    update.add_argument('--source')
+
+    bench = commands.add_parser('bench', help='measure sustained commands per second')
+    bench.add_argument('--items', default='1-100', help='item ids as a range like 1-100, or comma separated ids or names')
+    bench.add_argument('--batch', type=int, default=100, help='updates per batch (default 100)')
+    bench.add_argument('--seconds', type=float, default=5.0, help='how long to run (default 5)')
+    bench.add_argument('--window', type=int, default=ControlClient.WINDOW, help='unacknowledged batches allowed in flight')
+
+    args = parser.parse_args(argv)
+
+    try:
+
+        if args.command == 'update':
+
+            item = int(args.item) if args.item.isdigit() else args.item
+            with ControlClient(args.socket) as client: client.update(item, args.x, args.y, args.visible, args.source)
+            return 0
+
+        if '-' in args.items and args.items.replace('-', '').isdigit():
+
+            first, last = map(int, args.items.split('-'))
+            items = list(range(first, last + 1))
+
+        else: items = [int(item) if item.isdigit() else item for item in args.items.split(',')]
+
+        print(json.dumps(loadTest(args.socket, items, args.batch, args.seconds, args.window), indent=4))
+        return 0
+
+    except (OSError, ControlError) as e:
+
+        print(e, file=sys.stderr)
+        return 1
+
+if __name__ == '__main__':
+
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+from PySide6.QtCore import QObject, Signal
+
+DataKey = Tuple[str, str]
+
+def flatten(value, prefix: str = '') -> Dict[str, object]:
+
+    # Nested objects become dotted keys so bindings can name any leaf
+    if not isinstance(value, dict): return {prefix: value}
+
+    values = {}
+    for key, child in value.items(): values.update(flatten(child, '{}.{}'.format(prefix, key) if prefix else str(key)))
+
+    return values
+
+class DataSource(ABC):
+
+    def __init__(self, name: str):
+
+        self.name = name
+        self.hub: Optional['DataHub'] = None
+
+    @abstractmethod
+    async def run(self):
+
+        pass
+
+    def publish(self, data) -> bool:
+
+        # Parsing happens on the loop or its worker threads, never on the GUI thread
+        try: value = json.loads(data)
+        except ValueError: return False
+
+        if not isinstance(value, dict): return False
+
+        self.hub.publish(self.name, flatten(value))
+        return True
+
+class JsonFileSource(DataSource):
+
+    # Constants
+    POLL_SECONDS = 0.1
+
+    def __init__(self, name: str, path: str, interval: float = POLL_SECONDS):
+
+        super().__init__(name)
+        self.path = path
+        self.interval = interval
+
+    async def run(self):
+
+        stamp = None
+
+        while True:
+
+            stamp = await asyncio.to_thread(self.poll, stamp)
+            await asyncio.sleep(self.interval)
+
+    def poll(self, stamp: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+
+        try:
+
+            stat = os.stat(self.path)
+            current = (stat.st_mtime_ns, stat.st_size)
+            if current == stamp: return stamp
+
+            with open(self.path, 'rb') as file: data = file.read()
+
+        except OSError: return stamp
+
+        # A half-written file fails to parse and is simply read again next poll
+        return current if self.publish(data) else stamp
+
+class PipeSource(DataSource):
+
+    # Constants
+    LINE_LIMIT = 1024 * 1024
+
+    def __init__(self, name: str, path: str):
+
+        super().__init__(name)
+        self.path = path
+
+    async def run(self):
+
+        if not os.path.exists(self.path): os.mkfifo(self.path)
+
+        # Holding the write end too means writers can come and go without an EOF
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=self.LINE_LIMIT)
+        pipe = os.fdopen(os.open(self.path, os.O_RDWR | os.O_NONBLOCK), 'rb', 0)
+        transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+
+        try:
+
+            while True:
+
+                try: line = await reader.readline()
+                except ValueError: continue
+
+                if not line: break
+                if line.strip(): self.publish(line)
+
+        finally: transport.close()
+
+class UdpSource(DataSource):
+
+    class Protocol(asyncio.DatagramProtocol):
+
+        def __init__(self, source: 'UdpSource'):
+
+            self.source = source
+
+        def datagram_received(self, data: bytes, address):
+
+            self.source.publish(data)
+
+    # Constants
+    HOST = '127.0.0.1'
+
+    def __init__(self, name: str, port: int, host: str = HOST):
+
+        super().__init__(name)
+        self.port = port
+        self.host = host
+
+    async def run(self):
+
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: UdpSource.Protocol(self), local_addr=(self.host, self.port))
+
+        try: await loop.create_future()
+        finally: transport.close()
+
+class DataHub(QObject):
+
+    # Signals
+    changed = Signal()
+
+    # Constants
+    STOP_SECONDS = 2.0
+
+    __instance = None
+
+    @staticmethod
+    def instance() -> 'DataHub':
+
+        if DataHub.__instance is None: DataHub.__instance = DataHub()
+        return DataHub.__instance
+
+    def __init__(self):
+
+        super().__init__()
+        self.deliveries = 0
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+        self.__thread: Optional[threading.Thread] = None
+        self.__sources: Dict[str, DataSource] = {}
+        self.__tasks: Dict[str, Future] = {}
+        self.__values: Dict[DataKey, object] = {}
+        self.__pending: Dict[DataKey, object] = {}
+        self.__posted = False
+        self.__lock = threading.Lock()
+
+    def isRunning(self) -> bool:
+
+        return self.__loop is not None
+
+    def start(self):
+
+        if self.__loop is not None: return
+
+        # The asyncio loop runs beside Qt's on its own thread and only talks back through changed
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.__loop.run_forever, name='ElayvateData', daemon=True)
+        self.__thread.start()
+
+        for source in self.__sources.values(): self.launch(source)
+
+    def stop(self):
+
+        if self.__loop is None: return
+
+        # Sources get to close their pipes and sockets before the loop stops
+        self.__tasks.clear()
+        try: asyncio.run_coroutine_threadsafe(self.shutdown(), self.__loop).result(self.STOP_SECONDS)
+        except TimeoutError: pass
+
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join(self.STOP_SECONDS)
+        if not self.__thread.is_alive(): self.__loop.close()
+
+        self.__loop = None
+        self.__thread = None
+
+    async def shutdown(self):
+
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks: task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def addSource(self, source: DataSource):
+
+        self.removeSource(source.name)
+        source.hub = self
+        self.__sources[source.name] = source
+        if self.__loop is not None: self.launch(source)
+
+    def removeSource(self, name: str):
+
+        self.__sources.pop(name, None)
+        task = self.__tasks.pop(name, None)
+        if task is not None: task.cancel()
+
+    def sources(self) -> Dict[str, DataSource]:
+
+        return dict(self.__sources)
+
+    def launch(self, source: DataSource):
+
+        self.__tasks[source.name] = self.submit(self.runSource(source))
+
+    def submit(self, coroutine) -> Future:
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.__loop)
+
+    def callSoon(self, callback: Callable):
+
+        if self.__loop is not None: self.__loop.call_soon_threadsafe(callback)
+
+    async def runSource(self, source: DataSource):
+
+        try: await source.run()
+        except asyncio.CancelledError: raise
+        except Exception as e: print('Data source {} stopped: {}'.format(source.name, e), file=sys.stderr)
+
+    def publish(self, name: str, values: Dict[str, object]):
+
+        # Any number of writes between GUI turns collapse into one queued notification
+        with self.__lock:
+
+            for key, value in values.items(): self.__pending[(name, key)] = value
+            if self.__posted: return
+            self.__posted = True
+
+        self.changed.emit()
+
+    def take(self) -> Dict[DataKey, object]:
+
+        with self.__lock:
+
+            pending, self.__pending = self.__pending, {}
+            self.__posted = False
+
+        self.__values.update(pending)
+        if pending: self.deliveries += 1
+        return pending
+
+    def value(self, name: str, key: str, default = None):
+
+        return self.__values.get((name, key), default)
+
+    def values(self) -> Dict[DataKey, object]:
+
+        return dict(self.__values)
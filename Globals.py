@@ -140,6 +140,14 @@ class Style:
         font-weight: bold; 
     '''
 
+    FrameTimingHud = '''
+
+        background-color: #1e1e1e;
+        color: #fff;
+        font-family: monospace;
+        padding: 5px;
+    '''
+
     # Constants
     NoMargins = QMargins(0, 0, 0, 0)
     SmallMargins = QMargins(5, 5, 5, 5)
@@ -0,0 +1,270 @@
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from PySide6.QtCore import QObject, Signal
+
+from Models import OverlayItem
+
+Geometry = Tuple[int, int, int, int]
+
+class EditCommand:
+
+    # Constants
+    ENTRY_COST = 96
+
+    def __init__(self, text: str):
+
+        self.text = text
+
+    def cost(self) -> int:
+
+        return self.ENTRY_COST
+
+    def undo(self, editor):
+
+        pass
+
+    def redo(self, editor):
+
+        pass
+
+    def mergeWith(self, command: 'EditCommand') -> bool:
+
+        return False
+
+class GeometryCommand(EditCommand):
+
+    # Constants
+    MERGE_TEXTS = ('Nudge',)
+    MERGE_SECONDS = 1.0
+
+    def __init__(self, text: str, deltas: Dict[int, Tuple[Geometry, Geometry]]):
+
+        super().__init__(text)
+        self.deltas = deltas
+        self.stamp = time.monotonic()
+
+    def cost(self) -> int:
+
+        return self.ENTRY_COST * (1 + len(self.deltas))
+
+    def apply(self, editor, index: int):
+
+        for id, delta in self.deltas.items():
+
+            proxy = editor.proxies.byId(id)
+            if proxy is not None: proxy.setRect(*delta[index])
+
+    def undo(self, editor):
+
+        self.apply(editor, 0)
+
+    def redo(self, editor):
+
+        self.apply(editor, 1)
+
+    def mergeWith(self, command: EditCommand) -> bool:
+
+        # Repeated nudges of the same items read as one move
+        if not isinstance(command, GeometryCommand) or command.text != self.text or self.text not in self.MERGE_TEXTS: return False
+        if command.deltas.keys() != self.deltas.keys() or command.stamp - self.stamp > self.MERGE_SECONDS: return False
+
+        for id, (_, after) in command.deltas.items(): self.deltas[id] = (self.deltas[id][0], after)
+        self.stamp = command.stamp
+        return True
+
+class SourceCommand(EditCommand):
+
+    def __init__(self, id: int, before: str, after: str):
+
+        super().__init__('Change Source')
+        self.id = id
+        self.before = before
+        self.after = after
+
+    def cost(self) -> int:
+
+        return self.ENTRY_COST + sys.getsizeof(self.before) + sys.getsizeof(self.after)
+
+    def apply(self, editor, source: str):
+
+        proxy = editor.proxies.byId(self.id)
+        if proxy is not None: proxy.setSource(source)
+
+    def undo(self, editor):
+
+        self.apply(editor, self.before)
+
+    def redo(self, editor):
+
+        self.apply(editor, self.after)
+
+class LayerCommand(EditCommand):
+
+    def __init__(self, deltas: Dict[int, Tuple[str, str]]):
+
+        super().__init__('Change Layer')
+        self.deltas = deltas
+
+    def cost(self) -> int:
+
+        return self.ENTRY_COST * (1 + len(self.deltas))
+
+    def apply(self, editor, index: int):
+
+        for id, delta in self.deltas.items():
+
+            proxy = editor.proxies.byId(id)
+            if proxy is not None: proxy.setLayer(delta[index])
+
+    def undo(self, editor):
+
+        self.apply(editor, 0)
+
+    def redo(self, editor):
+
+        self.apply(editor, 1)
+
+class ItemsCommand(EditCommand):
+
+    def __init__(self, text: str, models: List[OverlayItem], added: bool):
+
+        super().__init__(text)
+        self.models = models
+        self.added = added
+
+    def cost(self) -> int:
+
+        return sum(self.ENTRY_COST + sys.getsizeof(model.name) + sys.getsizeof(model.source) for model in self.models)
+
+    def insert(self, editor):
+
+        editor.insertItems(self.models)
+
+    def remove(self, editor):
+
+        proxies = [editor.proxies.byId(model.id) for model in self.models]
+        editor.deleteItems([proxy for proxy in proxies if proxy is not None], record=False)
+
+    def undo(self, editor):
+
+        if self.added: self.remove(editor)
+        else: self.insert(editor)
+
+    def redo(self, editor):
+
+        if self.added: self.insert(editor)
+        else: self.remove(editor)
+
+class UndoStack(QObject):
+
+    # Signals
+    changed = Signal()
+
+    # Constants
+    DEFAULT_LIMIT = 4 * 1024 * 1024
+
+    def __init__(self, editor, limit: int = DEFAULT_LIMIT):
+
+        super().__init__()
+        self.editor = editor
+        self.limit = limit
+        self.__commands: List[EditCommand] = []
+        self.__costs: List[int] = []
+        self.__index = 0
+        self.__cost = 0
+
+    def setLimit(self, limit: int):
+
+        self.limit = limit
+        self.trim()
+
+    def cost(self) -> int:
+
+        return self.__cost
+
+    def count(self) -> int:
+
+        return len(self.__commands)
+
+    def canUndo(self) -> bool:
+
+        return self.__index > 0
+
+    def canRedo(self) -> bool:
+
+        return self.__index < len(self.__commands)
+
+    def undoText(self) -> Optional[str]:
+
+        return self.__commands[self.__index - 1].text if self.canUndo() else None
+
+    def redoText(self) -> Optional[str]:
+
+        return self.__commands[self.__index].text if self.canRedo() else None
+
+    def push(self, command: EditCommand):
+
+        # Commands arrive already applied, so pushing only records them
+        self.truncate(self.__index)
+
+        if self.__commands and self.__commands[-1].mergeWith(command): self.recost(len(self.__commands) - 1)
+        else:
+
+            self.__commands.append(command)
+            self.__costs.append(command.cost())
+            self.__cost += self.__costs[-1]
+            self.__index += 1
+
+        self.trim()
+        self.changed.emit()
+
+    def undo(self):
+
+        if not self.canUndo(): return
+
+        self.__index -= 1
+        self.__commands[self.__index].undo(self.editor)
+        self.changed.emit()
+
+    def redo(self):
+
+        if not self.canRedo(): return
+
+        self.__commands[self.__index].redo(self.editor)
+        self.__index += 1
+        self.changed.emit()
+
+    def clear(self):
+
+        self.truncate(0)
+        self.changed.emit()
+
+    def truncate(self, index: int):
+
+        self.__cost -= sum(self.__costs[index:])
+        del self.__commands[index:]
+        del self.__costs[index:]
+        self.__index = min(self.__index, index)
+
+    def recost(self, index: int):
+
+        cost = self.__commands[index].cost()
+        self.__cost += cost - self.__costs[index]
+        self.__costs[index] = cost
+
+    def trim(self):
+
+        # The oldest history goes first; the newest command always survives
+        drop = 0
+        while self.__cost > self.limit and drop < len(self.__commands) - 1:
+
+            self.__cost -= self.__costs[drop]
+            drop += 1
+
+        if drop == 0: return
+
+        del self.__commands[:drop]
+        del self.__costs[:drop]
+        self.__index = max(0, self.__index - drop)
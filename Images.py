@@ -0,0 +1,753 @@
+import hashlib
+import math
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from PySide6.QtCore import QFileSystemWatcher, QObject, QRunnable, QSize, QThreadPool, QTimer, Qt, Signal
+from PySide6.QtGui import QImage
+
+ImageKey = Tuple[str, int, int]
+
+def contentDigest(data: bytes) -> str:
+
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def scaleImage(image: QImage, size: QSize) -> QImage:
+
+    return image.scaled(
+
+        size,
+        Qt.AspectRatioMode.IgnoreAspectRatio,
+        Qt.TransformationMode.FastTransformation
+    )
+
+def smoothScaleImage(image: QImage, size: QSize) -> QImage:
+
+    return image.scaled(
+
+        size,
+        Qt.AspectRatioMode.IgnoreAspectRatio,
+        Qt.TransformationMode.SmoothTransformation
+    )
+
+class ImageEntry:
+
+    def __init__(self, image: QImage, owner: object = None):
+
+        self.image = image
+        self.owner = owner
+        self.refs = 0
+        self.levels: Dict[int, QImage] = {}
+        self.refined: Optional[QImage] = None
+
+    def cost(self) -> int:
+
+        # Mapped pack pixels live in the page cache, not on the heap
+        base = 0 if self.owner is not None else self.image.sizeInBytes()
+        if self.refined is not None: base += self.refined.sizeInBytes()
+
+        return base + sum(level.sizeInBytes() for level in self.levels.values())
+
+class ImageStore:
+
+    # Constants
+    DEFAULT_SOURCE = './images/no_image.jpg'
+    IDLE_BUDGET = 128 * 1024 * 1024
+    MIN_LEVEL_SIZE = 4
+    MAX_ZOOM_LEVELS = 2
+
+    __instance = None
+
+    @staticmethod
+    def instance() -> 'ImageStore':
+
+        if ImageStore.__instance is None: ImageStore.__instance = ImageStore()
+        return ImageStore.__instance
+
+    def __init__(self, budget: int = IDLE_BUDGET):
+
+        self.budget = budget
+        self.__entries: Dict[ImageKey, ImageEntry] = {}
+        self.__idle: OrderedDict[ImageKey, None] = OrderedDict()
+        self.__idleCost = 0
+        self.__digests: Dict[str, Tuple[int, int, str]] = {}
+        self.__packs: List[object] = []
+
+    def addPack(self, pack):
+
+        self.__packs = [pack] + [other for other in self.__packs if other.path != pack.path]
+
+    def clearPacks(self):
+
+        # Entries still in use keep their own pack, so its mapping goes away with the last of them
+        self.__packs = []
+
+    def packs(self) -> List[object]:
+
+        return list(self.__packs)
+
+    def acquirePacked(self, source: str, size: QSize) -> Tuple[Optional[ImageKey], Optional[QImage]]:
+
+        for pack in self.__packs:
+
+            entry = pack.find(source, size)
+            if entry is None: continue
+
+            key = (entry.digest, size.width(), size.height())
+            if key not in self.__entries: self.__entries[key] = ImageEntry(pack.image(entry), pack)
+
+            self.retain(key)
+            return key, self.__entries[key].image
+
+        return None, None
+
+    def digest(self, source: str) -> Optional[str]:
+
+        digest = self.cachedDigest(source)
+        if digest is not None: return digest
+
+        try:
+
+            stat = os.stat(source)
+            with open(source, 'rb') as file: data = file.read()
+
+        except OSError: return None
+
+        digest = contentDigest(data)
+        self.__digests[source] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def cachedDigest(self, source: str) -> Optional[str]:
+
+        try: stat = os.stat(source)
+        except OSError: return None
+
+        cached = self.__digests.get(source)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size): return cached[2]
+        return None
+
+    def acquire(self, source: str, size: QSize) -> Tuple[Optional[ImageKey], QImage]:
+
+        if source == '': source = self.DEFAULT_SOURCE
+
+        key, image = self.acquirePacked(source, size)
+        if image is not None: return key, image
+
+        digest = self.digest(source)
+        if digest is None: return None, QImage()
+
+        key = (digest, size.width(), size.height())
+        entry = self.__entries.get(key)
+
+        if entry is None:
+
+            original = self.original(source, digest)
+            if original.isNull(): return None, original
+
+            entry = ImageEntry(scaleImage(original, size))
+            self.__entries[key] = entry
+
+        self.retain(key)
+        return key, entry.image
+
+    def acquireCached(self, source: str, size: QSize) -> Tuple[Optional[ImageKey], Optional[QImage]]:
+
+        if source == '': source = self.DEFAULT_SOURCE
+
+        key, image = self.acquirePacked(source, size)
+        if image is not None: return key, image
+
+        digest = self.cachedDigest(source)
+        if digest is None: return None, None
+
+        key = (digest, size.width(), size.height())
+        if key not in self.__entries: return None, None
+
+        self.retain(key)
+        return key, self.__entries[key].image
+
+    def insert(self, source: str, stamp: Tuple[int, int], digest: str, original: QImage, scaled: QImage, size: QSize):
+
+        self.__digests[source] = (stamp[0], stamp[1], digest)
+
+        originalKey = (digest, -1, -1)
+        if originalKey not in self.__entries:
+
+            self.__entries[originalKey] = ImageEntry(original)
+            self.touch(originalKey)
+
+        key = (digest, size.width(), size.height())
+        if key not in self.__entries:
+
+            self.__entries[key] = ImageEntry(scaled)
+            self.touch(key)
+
+    def original(self, source: str, digest: str) -> QImage:
+
+        key = (digest, -1, -1)
+        entry = self.__entries.get(key)
+
+        if entry is not None:
+
+            self.touch(key)
+            return entry.image
+
+        image = QImage(source)
+        if image.isNull(): return image
+
+        self.__entries[key] = ImageEntry(image)
+        self.touch(key)
+        return image
+
+    def levelIndex(self, key: ImageKey, scale: float) -> int:
+
+        # Positive levels halve the base image, negative ones double it from the original
+        if scale <= 0 or abs(scale - 1) < 1e-3: return 0
+        if scale > 1: return -min(self.MAX_ZOOM_LEVELS, math.ceil(math.log2(scale)))
+
+        index = math.floor(math.log2(1 / scale))
+        while index > 0 and min(key[1], key[2]) >> index < self.MIN_LEVEL_SIZE: index -= 1
+
+        return index
+
+    def level(self, key: Optional[ImageKey], scale: float) -> Optional[QImage]:
+
+        entry = self.__entries.get(key) if key is not None else None
+        if entry is None or entry.refs == 0: return None
+
+        index = self.levelIndex(key, scale)
+        if index == 0: return entry.image
+
+        image = entry.levels.get(index)
+        if image is not None: return image
+
+        # Until the builder delivers, the closest finished level stands in, preferring more pixels
+        ready = min(list(entry.levels) + [0], key=lambda other: (abs(other - index), other))
+        return entry.levels[ready] if ready else entry.image
+
+    def levelJob(self, key: ImageKey, index: int) -> Optional[Tuple[QImage, List[Tuple[int, QSize]]]]:
+
+        entry = self.__entries.get(key)
+        if entry is None or entry.refs == 0 or index == 0 or index in entry.levels: return None
+
+        if index > 0:
+
+            # Each level is filtered from the one above so the pyramid costs a third of the base
+            start = max([other for other in entry.levels if 0 < other < index] + [0])
+            image = entry.levels[start] if start else entry.image
+            return image, [(other, QSize(max(1, key[1] >> other), max(1, key[2] >> other))) for other in range(start + 1, index + 1)]
+
+        original = self.__entries.get((key[0], -1, -1))
+        if original is None: return None
+
+        width = min(original.image.width(), key[1] << -index)
+        height = min(original.image.height(), key[2] << -index)
+        if width <= key[1] and height <= key[2]: return None
+
+        return original.image, [(index, QSize(width, height))]
+
+    def setLevels(self, key: ImageKey, levels: List[Tuple[int, QImage]]):
+
+        entry = self.__entries.get(key)
+        if entry is None: return
+
+        cost = entry.cost()
+        for index, image in levels: entry.levels.setdefault(index, image)
+
+        if key in self.__idle:
+
+            self.__idleCost += entry.cost() - cost
+            self.evict()
+
+    def refined(self, key: Optional[ImageKey]) -> Optional[QImage]:
+
+        entry = self.__entries.get(key) if key is not None else None
+        return entry.refined if entry is not None else None
+
+    def setRefined(self, key: ImageKey, image: QImage):
+
+        entry = self.__entries.get(key)
+        if entry is None: return
+
+        cost = entry.cost()
+        entry.refined = image
+
+        if key in self.__idle:
+
+            self.__idleCost += entry.cost() - cost
+            self.evict()
+
+    def cachedOriginal(self, key: ImageKey) -> QImage:
+
+        entry = self.__entries.get((key[0], -1, -1))
+        return entry.image if entry is not None else QImage()
+
+    def retain(self, key: ImageKey):
+
+        entry = self.__entries[key]
+        entry.refs += 1
+
+        if entry.refs == 1 and key in self.__idle:
+
+            del self.__idle[key]
+            self.__idleCost -= entry.cost()
+
+    def release(self, key: Optional[ImageKey]):
+
+        if key is None: return
+
+        entry = self.__entries.get(key)
+        if entry is None or entry.refs == 0: return
+
+        entry.refs -= 1
+        if entry.refs == 0: self.touch(key)
+
+    def touch(self, key: ImageKey):
+
+        entry = self.__entries[key]
+        if entry.refs > 0: return
+
+        if key in self.__idle: self.__idle.move_to_end(key)
+        else:
+
+            self.__idle[key] = None
+            self.__idleCost += entry.cost()
+
+        self.evict()
+
+    def evict(self):
+
+        while self.__idleCost > self.budget and self.__idle:
+
+            key, _ = self.__idle.popitem(last=False)
+            self.__idleCost -= self.__entries.pop(key).cost()
+
+    def clear(self):
+
+        for key in list(self.__idle): self.__idleCost -= self.__entries.pop(key).cost()
+        self.__idle.clear()
+
+    def stats(self) -> Dict[str, int]:
+
+        return {
+
+            'entries': len(self.__entries),
+            'idle': len(self.__idle),
+            'idleBytes': self.__idleCost,
+            'liveBytes': sum(entry.cost() for entry in self.__entries.values() if entry.refs > 0)
+        }
+
+class ImageRequest:
+
+    def __init__(self, task: 'ImageDecodeTask', callback: Callable):
+
+        self.task = task
+        self.callback = callback
+        self.cancelled = False
+
+class ImageDecodeTask(QRunnable):
+
+    def __init__(self, loader: 'ImageLoader', source: str, size: QSize):
+
+        super().__init__()
+        self.setAutoDelete(False)
+
+        self.loader = loader
+        self.source = source
+        self.size = size
+        self.requests: Set[ImageRequest] = set()
+
+    def run(self):
+
+        try:
+
+            stat = os.stat(self.source)
+            with open(self.source, 'rb') as file: data = file.read()
+
+        except OSError: 
+            
+            self.loader.decoded.emit(self, None)
+            return
+
+        original = QImage.fromData(data)
+        if original.isNull(): 
+            
+            self.loader.decoded.emit(self, None)
+            return
+
+        result = ((stat.st_mtime_ns, stat.st_size), contentDigest(data), original, scaleImage(original, self.size))
+        self.loader.decoded.emit(self, result)
+
+class ImageLoader(QObject):
+
+    decoded = Signal(object, object)
+
+    __instance = None
+
+    @staticmethod
+    def instance() -> 'ImageLoader':
+
+        if ImageLoader.__instance is None: ImageLoader.__instance = ImageLoader()
+        return ImageLoader.__instance
+
+    def __init__(self):
+
+        super().__init__()
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, QThreadPool.globalInstance().maxThreadCount() - 1))
+        self.__tasks: Dict[Tuple[str, int, int], ImageDecodeTask] = {}
+        self.decoded.connect(self.onDecoded, Qt.ConnectionType.QueuedConnection)
+
+    def load(self, source: str, size: QSize, callback: Callable) -> ImageRequest:
+
+        taskKey = (source, size.width(), size.height())
+        task = self.__tasks.get(taskKey)
+
+        if task is None:
+
+            task = ImageDecodeTask(self, source, size)
+            self.__tasks[taskKey] = task
+            self.pool.start(task)
+
+        request = ImageRequest(task, callback)
+        task.requests.add(request)
+        return request
+
+    def cancel(self, request: Optional[ImageRequest]):
+
+        if request is None or request.cancelled: return
+
+        request.cancelled = True
+        task = request.task
+        task.requests.discard(request)
+
+        if not task.requests and self.pool.tryTake(task): 
+            
+            del self.__tasks[(task.source, task.size.width(), task.size.height())]
+
+    def pending(self) -> int:
+
+        return len(self.__tasks)
+
+    def waitForDone(self, msecs: int = -1) -> bool:
+
+        return self.pool.waitForDone(msecs)
+
+    def onDecoded(self, task: ImageDecodeTask, result):
+
+        taskKey = (task.source, task.size.width(), task.size.height())
+        if self.__tasks.get(taskKey) is task: del self.__tasks[taskKey]
+
+        store = ImageStore.instance()
+        if result is not None: store.insert(task.source, *result, task.size)
+
+        for request in task.requests:
+
+            if request.cancelled: continue
+
+            key, image = (None, QImage()) if result is None else store.acquire(task.source, task.size)
+            request.callback(key, image)
+
+class ImageRefineTask(QRunnable):
+
+    def __init__(self, refiner: 'ImageRefiner', key: ImageKey, source: str, original: QImage):
+
+        super().__init__()
+        self.refiner = refiner
+        self.key = key
+        self.source = source
+        self.original = original
+
+    def run(self):
+
+        original = self.original if not self.original.isNull() else QImage(self.source)
+        if original.isNull(): 
+
+            self.refiner.refined.emit(self.key, None)
+            return
+
+        self.refiner.refined.emit(self.key, smoothScaleImage(original, QSize(self.key[1], self.key[2])))
+
+class ImageRefiner(QObject):
+
+    refined = Signal(object, object)
+
+    # Constants
+    SETTLE_MSECS = 250
+
+    __instance = None
+
+    @staticmethod
+    def instance() -> 'ImageRefiner':
+
+        if ImageRefiner.__instance is None: ImageRefiner.__instance = ImageRefiner()
+        return ImageRefiner.__instance
+
+    def __init__(self):
+
+        super().__init__()
+        self.__sources: Dict[ImageKey, str] = {}
+        self.__waiting: Dict[ImageKey, Dict[int, Callable]] = {}
+        self.__running: Dict[ImageKey, Dict[int, Callable]] = {}
+        self.__owners: Dict[int, ImageKey] = {}
+        self.refined.connect(self.onRefined, Qt.ConnectionType.QueuedConnection)
+
+        # Refinement waits until nothing has been resized for a while
+        self.__timer = QTimer(self)
+        self.__timer.setSingleShot(True)
+        self.__timer.setInterval(self.SETTLE_MSECS)
+        self.__timer.timeout.connect(self.flush)
+
+    def request(self, key: ImageKey, source: str, owner: int, callback: Callable):
+
+        self.cancel(owner)
+
+        self.__owners[owner] = key
+        self.__sources[key] = source or ImageStore.DEFAULT_SOURCE
+        queue = self.__running if key in self.__running else self.__waiting
+        queue.setdefault(key, {})[owner] = callback
+        self.__timer.start()
+
+    def cancel(self, owner: int):
+
+        key = self.__owners.pop(owner, None)
+        if key is None: return
+
+        for queue in (self.__waiting, self.__running):
+
+            callbacks = queue.get(key)
+            if callbacks is None: continue
+
+            callbacks.pop(owner, None)
+            if not callbacks and queue is self.__waiting: del queue[key]
+
+    def pending(self) -> int:
+
+        return len(self.__waiting) + len(self.__running)
+
+    def flush(self):
+
+        store = ImageStore.instance()
+        loader = ImageLoader.instance()
+
+        for key, callbacks in self.__waiting.items():
+
+            self.__running[key] = callbacks
+            loader.pool.start(ImageRefineTask(self, key, self.__sources[key], store.cachedOriginal(key)))
+
+        self.__waiting.clear()
+
+    def onRefined(self, key: ImageKey, image: Optional[QImage]):
+
+        callbacks = self.__running.pop(key, {})
+        self.__sources.pop(key, None)
+        for owner in callbacks: self.__owners.pop(owner, None)
+
+        if image is None: return
+
+        ImageStore.instance().setRefined(key, image)
+        for callback in callbacks.values(): callback()
+
+class ImageLevelTask(QRunnable):
+
+    def __init__(self, builder: 'ImageLevelBuilder', key: ImageKey, index: int, image: QImage, sizes: List[Tuple[int, QSize]]):
+
+        super().__init__()
+        self.builder = builder
+        self.key = key
+        self.index = index
+        self.image = image
+        self.sizes = sizes
+
+    def run(self):
+
+        image = self.image
+        levels = []
+
+        for index, size in self.sizes:
+
+            image = smoothScaleImage(image, size)
+            levels.append((index, image))
+
+        self.builder.built.emit(self, levels)
+
+class ImageLevelBuilder(QObject):
+
+    built = Signal(object, object)
+
+    __instance = None
+
+    @staticmethod
+    def instance() -> 'ImageLevelBuilder':
+
+        if ImageLevelBuilder.__instance is None: ImageLevelBuilder.__instance = ImageLevelBuilder()
+        return ImageLevelBuilder.__instance
+
+    def __init__(self):
+
+        super().__init__()
+        self.__running: Dict[Tuple[ImageKey, int], Dict[int, Callable]] = {}
+        self.__owners: Dict[int, Tuple[ImageKey, int]] = {}
+        self.built.connect(self.onBuilt, Qt.ConnectionType.QueuedConnection)
+
+    def request(self, key: ImageKey, index: int, owner: int, callback: Callable):
+
+        # Mipmap filtering runs on the decode pool so a zoom never stalls a paint
+        job = (key, index)
+        if self.__owners.get(owner) == job: return
+
+        self.cancel(owner)
+
+        if job not in self.__running:
+
+            work = ImageStore.instance().levelJob(key, index)
+            if work is None: return
+
+            self.__running[job] = {}
+            ImageLoader.instance().pool.start(ImageLevelTask(self, key, index, *work))
+
+        self.__running[job][owner] = callback
+        self.__owners[owner] = job
+
+    def cancel(self, owner: int):
+
+        job = self.__owners.pop(owner, None)
+        if job is not None and job in self.__running: self.__running[job].pop(owner, None)
+
+    def pending(self) -> int:
+
+        return len(self.__running)
+
+    def onBuilt(self, task: ImageLevelTask, levels: List[Tuple[int, QImage]]):
+
+        callbacks = self.__running.pop((task.key, task.index), {})
+        for owner in callbacks: self.__owners.pop(owner, None)
+
+        ImageStore.instance().setLevels(task.key, levels)
+        for callback in callbacks.values(): callback()
+
+class SourceReloadTask(QRunnable):
+
+    def __init__(self, watcher: 'SourceWatcher', source: str, sizes: List[QSize]):
+
+        super().__init__()
+        self.watcher = watcher
+        self.source = source
+        self.sizes = sizes
+
+    def run(self):
+
+        try:
+
+            stat = os.stat(self.source)
+            with open(self.source, 'rb') as file: data = file.read()
+
+        except OSError:
+
+            self.watcher.reloaded.emit(self, None)
+            return
+
+        # A half-written file fails to decode; the next change event retries
+        original = QImage.fromData(data)
+        if original.isNull():
+
+            self.watcher.reloaded.emit(self, None)
+            return
+
+        scaled = [(size, scaleImage(original, size)) for size in self.sizes]
+        self.watcher.reloaded.emit(self, ((stat.st_mtime_ns, stat.st_size), contentDigest(data), original, scaled))
+
+class SourceWatcher(QObject):
+
+    reloaded = Signal(object, object)
+
+    # Constants
+    DEBOUNCE_MSECS = 300
+
+    __instance = None
+
+    @staticmethod
+    def instance() -> 'SourceWatcher':
+
+        if SourceWatcher.__instance is None: SourceWatcher.__instance = SourceWatcher()
+        return SourceWatcher.__instance
+
+    def __init__(self):
+
+        super().__init__()
+        self.__owners: Dict[str, Dict[int, Tuple[Callable, Callable]]] = {}
+        self.__sources: Dict[int, str] = {}
+        self.__changed: Set[str] = set()
+        self.reloads = 0
+
+        self.__watcher = QFileSystemWatcher(self)
+        self.__watcher.fileChanged.connect(self.onFileChanged)
+        self.reloaded.connect(self.onReloaded, Qt.ConnectionType.QueuedConnection)
+
+        # Editors save in bursts (truncate, write, rename), so wait for them to go quiet
+        self.__timer = QTimer(self)
+        self.__timer.setSingleShot(True)
+        self.__timer.setInterval(self.DEBOUNCE_MSECS)
+        self.__timer.timeout.connect(self.flush)
+
+    def watch(self, source: str, key: int, size: Callable, callback: Callable):
+
+        self.unwatch(key)
+        if source == '': return
+
+        owners = self.__owners.setdefault(source, {})
+        if not owners and os.path.exists(source): self.__watcher.addPath(source)
+
+        owners[key] = (size, callback)
+        self.__sources[key] = source
+
+    def unwatch(self, key: int):
+
+        source = self.__sources.pop(key, None)
+        if source is None: return
+
+        owners = self.__owners[source]
+        owners.pop(key, None)
+        if owners: return
+
+        del self.__owners[source]
+        if source in self.__watcher.files(): self.__watcher.removePath(source)
+
+    def files(self) -> List[str]:
+
+        return list(self.__owners)
+
+    def onFileChanged(self, path: str):
+
+        self.__changed.add(path)
+        self.__timer.start()
+
+    def flush(self):
+
+        loader = ImageLoader.instance()
+
+        for source in self.__changed:
+
+            owners = self.__owners.get(source)
+            if not owners: continue
+
+            # Saving by rename drops the watch, so put it back on the new file
+            if source not in self.__watcher.files() and os.path.exists(source): self.__watcher.addPath(source)
+
+            sizes = {}
+            for size, _ in owners.values(): sizes[(size().width(), size().height())] = size()
+            loader.pool.start(SourceReloadTask(self, source, list(sizes.values())))
+
+        self.__changed.clear()
+
+    def onReloaded(self, task: SourceReloadTask, result):
+
+        if result is None: return
+
+        store = ImageStore.instance()
+        stamp, digest, original, scaled = result
+        for size, image in scaled: store.insert(task.source, stamp, digest, original, image, size)
+
+        self.reloads += 1
+        for _, callback in list(self.__owners.get(task.source, {}).values()): callback()
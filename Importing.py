@@ -0,0 +1,205 @@
+import os
+from typing import Dict, Iterable, List, Optional
+
+from PySide6.QtCore import QObject, QPoint, QRunnable, QSize, Qt, QTimer, Signal
+from PySide6.QtGui import QImage, QImageReader
+
+from Images import ImageLoader, ImageStore, contentDigest, scaleImage
+from Models import OverlayItem
+
+def importableFiles(paths: Iterable[str]) -> List[str]:
+
+    extensions = set('.' + bytes(format).decode() for format in QImageReader.supportedImageFormats())
+    files = []
+
+    for path in paths:
+
+        if os.path.isdir(path):
+
+            for root, directories, names in os.walk(path):
+
+                directories.sort()
+                files.extend(os.path.join(root, name) for name in sorted(names) if os.path.splitext(name)[1].lower() in extensions)
+
+        elif os.path.splitext(path)[1].lower() in extensions: files.append(path)
+
+    return files
+
+def fitSize(width: int, height: int, cell: int, maxSide: int) -> QSize:
+
+    scale = min(1.0, maxSide / max(width, height, 1))
+    return QSize(
+
+        max(cell, round(width * scale / cell) * cell),
+        max(cell, round(height * scale / cell) * cell)
+    )
+
+class ImportDecodeTask(QRunnable):
+
+    def __init__(self, importer: 'ImageImporter', index: int, source: str, cell: int, maxSide: int):
+
+        super().__init__()
+        self.setAutoDelete(False)
+
+        self.importer = importer
+        self.index = index
+        self.source = source
+        self.cell = cell
+        self.maxSide = maxSide
+
+    def run(self):
+
+        try:
+
+            stat = os.stat(self.source)
+            with open(self.source, 'rb') as file: data = file.read()
+
+        except OSError:
+
+            self.importer.decoded.emit(self, None)
+            return
+
+        original = QImage.fromData(data)
+        if original.isNull():
+
+            self.importer.decoded.emit(self, None)
+            return
+
+        size = fitSize(original.width(), original.height(), self.cell, self.maxSide)
+        self.importer.decoded.emit(self, ((stat.st_mtime_ns, stat.st_size), contentDigest(data), original, scaleImage(original, size), size))
+
+class ImageImporter(QObject):
+
+    # Signals
+    decoded = Signal(object, object)
+    batchReady = Signal(object)
+    progress = Signal(int, int)
+    finished = Signal()
+
+    # Constants
+    MAX_SIDE = 256
+    FLUSH_MSECS = 100
+
+    def __init__(self, paths: List[str], origin: QPoint, cell: int, bounds: QSize):
+
+        super().__init__()
+        self.paths = paths
+        self.cell = cell
+        self.bounds = bounds
+        self.done = 0
+
+        self.__left = origin.x()
+        self.__top = origin.y()
+        self.__cursor = QPoint(origin)
+        self.__rowHeight = 0
+        self.__pages = 0
+        self.__next = 0
+        self.__tasks: List[ImportDecodeTask] = []
+        self.__results: Dict[int, Optional[tuple]] = {}
+        self.__batch: List[OverlayItem] = []
+        self.__cancelled = False
+        self.decoded.connect(self.onDecoded, Qt.ConnectionType.QueuedConnection)
+
+        # Inserts are batched so a large import costs a handful of scene updates
+        self.__timer = QTimer(self)
+        self.__timer.setSingleShot(True)
+        self.__timer.setInterval(self.FLUSH_MSECS)
+        self.__timer.timeout.connect(self.flush)
+
+    def start(self):
+
+        pool = ImageLoader.instance().pool
+
+        for index, path in enumerate(self.paths):
+
+            task = ImportDecodeTask(self, index, path, self.cell, self.MAX_SIDE)
+            self.__tasks.append(task)
+            pool.start(task)
+
+        if not self.paths: self.finish()
+
+    def cancel(self):
+
+        if self.__cancelled: return
+
+        # Queued decodes are dropped; running ones still report in before finished
+        self.__cancelled = True
+        pool = ImageLoader.instance().pool
+        self.done += sum(1 for task in self.__tasks if pool.tryTake(task))
+
+        self.flush()
+        if self.done == len(self.paths): self.finish()
+
+    def isCancelled(self) -> bool:
+
+        return self.__cancelled
+
+    def onDecoded(self, task: ImportDecodeTask, result):
+
+        self.done += 1
+
+        if self.__cancelled:
+
+            if self.done == len(self.paths): self.finish()
+            return
+
+        self.__results[task.index] = result
+        if result is not None: ImageStore.instance().insert(task.source, *result)
+
+        # Place in file order so repeated imports give the same layout
+        while self.__next in self.__results:
+
+            result = self.__results.pop(self.__next)
+            if result is not None: self.__batch.append(self.place(self.paths[self.__next], result[-1]))
+            self.__next += 1
+
+        self.progress.emit(self.done, len(self.paths))
+
+        if self.done == len(self.paths):
+
+            self.flush()
+            self.finish()
+
+        elif not self.__timer.isActive(): self.__timer.start()
+
+    def place(self, source: str, size: QSize) -> OverlayItem:
+
+        # Shelf packing: fill a row left to right, then drop below its tallest item
+        if self.__cursor.x() > self.__left and self.__cursor.x() + size.width() > self.bounds.width():
+
+            self.__cursor = QPoint(self.__left, self.__cursor.y() + self.__rowHeight + self.cell)
+            self.__rowHeight = 0
+
+        # A full screen starts over from the top left, cascaded a step further so nothing lands on an earlier item
+        if self.__cursor.y() > self.__top and self.__cursor.y() + size.height() > self.bounds.height():
+
+            self.__pages += 1
+            steps = max(1, min(self.bounds.width(), self.bounds.height()) // (2 * self.cell))
+            self.__left = self.__top = self.cell * (1 + (self.__pages - 1) % steps)
+            self.__cursor = QPoint(self.__left, self.__top)
+            self.__rowHeight = 0
+
+        model = OverlayItem()
+        model.name = os.path.splitext(os.path.basename(source))[0]
+        model.source = source
+        model.x = self.__cursor.x()
+        model.y = min(self.__cursor.y(), max(0, self.bounds.height() - size.height()))
+        model.width = size.width()
+        model.height = size.height()
+
+        self.__cursor.setX(self.__cursor.x() + size.width() + self.cell)
+        self.__rowHeight = max(self.__rowHeight, size.height())
+        return model
+
+    def flush(self):
+
+        self.__timer.stop()
+        if not self.__batch: return
+
+        batch, self.__batch = self.__batch, []
+        self.batchReady.emit(batch)
+
+    def finish(self):
+
+        self.__tasks.clear()
+        self.finished.emit()
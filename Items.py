@@ -1,11 +1,17 @@
 
+import math
 from os import set_inheritable
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple
+from Animations import AnimationStore
 from Globals import Colors, Math
+from Images import ImageLevelBuilder, ImageLoader, ImageRefiner, ImageStore, SourceWatcher
+from Layers import LayerRegistry
+from Scheduling import OverlayUpdateScheduler
+from Texts import TextStore
 
-from PySide6.QtGui import QBitmap, QColor, QFocusEvent, QImage, QKeyEvent, QPainter, QPen, QPixmap
+from PySide6.QtGui import QBitmap, QColor, QFocusEvent, QFont, QImage, QKeyEvent, QPainter, QPen, QPixmap, QStaticText, QTransform
 from PySide6.QtWidgets import QApplication, QGraphicsItem, QGraphicsItemGroup, QGraphicsLineItem, QGraphicsRectItem, QGraphicsSceneContextMenuEvent, QGraphicsSceneHoverEvent, QGraphicsSceneMouseEvent, QListWidgetItem, QMenu, QStyleOptionGraphicsItem, QWidget
-from PySide6.QtCore import QPoint, QRect, QRectF, QSize, Qt
+from PySide6.QtCore import QLineF, QPoint, QPointF, QRect, QRectF, QSize, Qt
 
 class OverlayListWidgetItem(QListWidgetItem):
 
@@ -16,39 +22,95 @@ class OverlayListWidgetItem(QListWidgetItem):
 
 class OverlayPreviewGraphicsItem(QGraphicsRectItem):
 
+    # Constants
+    FLAGS = QGraphicsItem.ItemIsMovable | QGraphicsItem.ItemIsSelectable \
+        | QGraphicsItem.ItemSendsGeometryChanges | QGraphicsItem.ItemSendsScenePositionChanges
+    POSITION_CHANGED = QGraphicsItem.ItemPositionHasChanged
+    TEXT_SCALE = 0.75
+    MIN_TEXT_SIZE = 6
+
     def __init__(self, parent: QWidget, x: int, y: int, width: int, height: int):
 
         super().__init__(x, y, width, height)
         self.setAcceptHoverEvents(True)
-        self.setFlag(QGraphicsItem.ItemIsMovable, True)
-        self.setFlag(QGraphicsItem.ItemIsSelectable, True)
-        self.setFlag(QGraphicsRectItem.ItemSendsGeometryChanges, True)
-        self.setFlag(QGraphicsRectItem.ItemSendsScenePositionChanges, True)
+        self.setFlags(self.FLAGS)
         self.setBrush(Qt.NoBrush)
         self.setPen(Qt.NoPen)
 
         self.parent = parent
         self.isDragging = False
+        self.__source = ''
+        self.__image = QImage()
+        self.__imageKey = None
+        self.__request = None
+        self.__deferred = False
+        self.__animation = None
+        self.__text = None
+        self.__staticText = QStaticText()
+        self.__font = QFont()
+        self.__imageSource = ''
+        self.__layer = LayerRegistry.DEFAULT
+        self.__watched = ''
+        self.__linked = []
+        self.__subscribers: Dict[int, Callable] = {}
         self.setDefaultImage()
 
     def source(self) -> str: 
 
         return self.__source
 
+    def layer(self) -> str:
+
+        return self.__layer
+
+    def setLayer(self, name: str):
+
+        layer = LayerRegistry.instance().get(name)
+        self.__layer = layer.name
+
+        # Stacking follows the layer so the editor shows the same order as the overlay;
+        # the fractional part is the item's place inside its layer and moves with it
+        z = layer.z + self.zValue() % 1
+        self.setZValue(z)
+        for item in self.__linked:
+
+            item.setZValue(z)
+            item.update()
+
+        self.notify()
+
     def image(self) -> QImage:
 
+        if self.__animation is not None and self.__animation.isReady(): return self.__animation.current()
         return self.__image
 
-    def setDefaultImage(self):
+    def finalImage(self) -> QImage:
 
-        self.__source = ''
-        self.__image = QImage('./images/no_image.jpg')
-        self.__image = self.__image.scaled(
+        if self.__animation is not None and self.__animation.isReady(): return self.__animation.current()
 
-            QSize(self.rect().width(), self.rect().height()), 
-            Qt.AspectRatioMode.IgnoreAspectRatio, 
-            Qt.TransformationMode.FastTransformation
-        )
+        refined = ImageStore.instance().refined(self.__imageKey)
+        return self.__image if refined is None else refined
+
+    def imageLevel(self, scale: float) -> Optional[QImage]:
+
+        if self.__animation is not None and self.__animation.isReady(): return None
+
+        store = ImageStore.instance()
+        builder = ImageLevelBuilder.instance()
+        index = store.levelIndex(self.__imageKey, scale) if self.__imageKey is not None else 0
+
+        if index == 0:
+
+            builder.cancel(id(self))
+            return None
+
+        level = store.level(self.__imageKey, scale)
+        builder.request(self.__imageKey, index, id(self), self.update)
+        return level
+
+    def setDefaultImage(self):
+
+        self.setImage('')
 
     def setSource(self, source: str):
 
@@ -56,25 +118,236 @@ class OverlayPreviewGraphicsItem(QGraphicsRectItem):
 
     def setImage(self, source):
 
-        if source == '': 
+        store = ImageStore.instance()
+        loader = ImageLoader.instance()
+        size = self.imageSize()
+
+        loader.cancel(self.__request)
+        self.__request = None
+        self.__deferred = False
+        self.setAnimation(source)
+        self.setText(source)
+        self.watchSource('' if self.__text is not None else source)
+
+        if self.__text is not None:
+
+            self.__source = source
+            self.setDecodedImage(None, QImage(), '')
+            self.notify()
+            return
+
+        key, image = store.acquireCached(source, size)
 
-            self.setDefaultImage()
-            return 
+        if image is None and source != '':
+
+            # Keep showing the current image while a resize is decoded
+            self.__request = loader.load(source, size, self.onImageDecoded)
+            keepCurrent = source == self.__source and not self.__image.isNull()
+            self.__source = source
+
+            if not keepCurrent: self.setPlaceholder()
+            self.notify()
+            return
+
+        if image is None: key, image = store.acquire(source, size)
 
         self.__source = source
-        self.__image = QImage(source)
-        self.__image = self.__image.scaled(
+        self.setDecodedImage(key, image, source)
+        self.notify()
 
-            QSize(self.rect().width(), self.rect().height()), 
-            Qt.AspectRatioMode.IgnoreAspectRatio, 
-            Qt.TransformationMode.FastTransformation
-        )
+    def setDeferredSource(self, source: str):
 
-    def itemChange(self, change: QGraphicsItem.GraphicsItemChange, value):
+        # Text has nothing to decode, so there is no reason to defer it
+        if TextStore.isText(source):
+
+            self.setImage(source)
+            return
+
+        ImageLoader.instance().cancel(self.__request)
+        self.__request = None
+        self.__source = source
+        self.__deferred = source != ''
+        self.watchSource(source)
+        self.notify()
+
+    def watchSource(self, source: str):
+
+        if source == self.__watched: return
+
+        self.__watched = source
+        SourceWatcher.instance().watch(source, id(self), self.imageSize, self.onSourceChanged)
+
+    def onSourceChanged(self):
+
+        # The watcher has already decoded the new file at this size, so this swaps from cache
+        if not self.__deferred: self.setImage(self.__source)
+
+    def ensureImage(self):
+
+        if self.__deferred: self.setImage(self.__source)
+
+    def setPlaceholder(self):
+
+        self.setDecodedImage(*ImageStore.instance().acquire('', self.imageSize()), '')
+
+    def setDecodedImage(self, key, image: QImage, source: str):
+
+        ImageStore.instance().release(self.__imageKey)
+        self.__imageKey = key
+        self.__image = image
+        self.__imageSource = source
+        self.imageChanged()
+        self.refine()
+
+    def onImageDecoded(self, key, image: QImage):
+
+        self.__request = None
+        if key is not None: self.setDecodedImage(key, image, self.__source)
+
+    def refine(self):
+
+        # Only the overlay shows the smooth resample, and it waits for the geometry to settle
+        refiner = ImageRefiner.instance()
+        refiner.cancel(id(self))
+
+        if not self.__linked or self.__imageKey is None or self.__animation is not None: return
+        if ImageStore.instance().refined(self.__imageKey) is not None: return
+
+        refiner.request(self.__imageKey, self.__imageSource, id(self), self.onImageRefined)
+
+    def onImageRefined(self):
+
+        for item in self.__linked: item.update()
+
+    def setAnimation(self, source: str):
+
+        store = AnimationStore.instance()
+        animation = store.acquire(source, self.imageSize())
+        store.release(self.__animation, id(self))
+
+        self.__animation = animation
+        if animation is not None: animation.subscribe(id(self), self.onAnimationChanged)
+
+    def onAnimationChanged(self):
+
+        if self.__animation is not None and self.__animation.static:
+
+            AnimationStore.instance().release(self.__animation, id(self))
+            self.__animation = None
+            self.refine()
+
+        self.imageChanged()
+
+    def setText(self, source: str):
+
+        store = TextStore.instance()
+        text = store.acquire(source)
+        store.release(self.__text, id(self))
+
+        self.__text = text
+        if text is None: return
+
+        # The layout is cached per item and only redone when the value changes
+        self.__font = QFont()
+        self.__font.setPixelSize(max(self.MIN_TEXT_SIZE, int(self.rect().height() * self.TEXT_SCALE)))
+        self.__staticText = QStaticText(text.value)
+        self.__staticText.setTextFormat(Qt.TextFormat.PlainText)
+        self.__staticText.prepare(QTransform(), self.__font)
+        text.subscribe(id(self), self.onTextChanged)
+
+    def textRect(self) -> QRectF:
+
+        return QRectF(QPointF(0, 0), self.__staticText.size()).intersected(self.rect())
+
+    def onTextChanged(self):
+
+        # Only the glyphs that changed are damaged, not the whole item
+        dirty = self.textRect()
+        self.__staticText.setText(self.__text.value)
+        dirty = dirty.united(self.textRect())
+
+        self.update(dirty)
+        for item in self.__linked: item.update(dirty)
+
+    def paintText(self, painter: QPainter) -> bool:
+
+        if self.__text is None: return False
+
+        painter.setFont(self.__font)
+        painter.setPen(QColor(Colors.White))
+
+        if self.textRect().size() == self.__staticText.size(): painter.drawStaticText(0, 0, self.__staticText)
+        else:
+
+            painter.save()
+            painter.setClipRect(self.rect(), Qt.ClipOperation.IntersectClip)
+            painter.drawStaticText(0, 0, self.__staticText)
+            painter.restore()
+
+        return True
+
+    def releaseImage(self):
+
+        ImageLoader.instance().cancel(self.__request)
+        ImageRefiner.instance().cancel(id(self))
+        ImageLevelBuilder.instance().cancel(id(self))
+        SourceWatcher.instance().unwatch(id(self))
+        ImageStore.instance().release(self.__imageKey)
+        AnimationStore.instance().release(self.__animation, id(self))
+        TextStore.instance().release(self.__text, id(self))
+        self.__request = None
+        self.__imageKey = None
+        self.__animation = None
+        self.__text = None
+        self.__watched = ''
+
+    def subscribe(self, key: int, callback: Callable):
 
-        if change == QGraphicsItem.ItemSelectedChange:
+        self.__subscribers[key] = callback
 
-            self.parent.selectItem(value, graphics=self)
+    def unsubscribe(self, key: int):
+
+        self.__subscribers.pop(key, None)
+
+    def notify(self):
+
+        for callback in list(self.__subscribers.values()): callback()
+
+    def link(self, item: QGraphicsItem):
+
+        self.__linked.append(item)
+        self.refine()
+
+    def imageChanged(self):
+
+        self.update()
+        for item in self.__linked: item.update()
+
+    def geometryChanged(self):
+
+        scheduler = OverlayUpdateScheduler.instance()
+
+        for item in self.__linked:
+
+            if self.isDragging: scheduler.schedule(id(item), item.syncGeometry)
+            else:
+
+                scheduler.cancel(id(item))
+                item.syncGeometry()
+
+        if self.__subscribers: self.notify()
+
+    def geometry(self) -> Tuple[int, int, int, int]:
+
+        return (int(self.x()), int(self.y()), int(self.rect().width()), int(self.rect().height()))
+
+    def imageSize(self) -> QSize:
+
+        return QSize(int(self.rect().width()), int(self.rect().height()))
+
+    def itemChange(self, change: QGraphicsItem.GraphicsItemChange, value):
+
+        if change == self.POSITION_CHANGED: self.geometryChanged()
 
         return super().itemChange(change, value)
 
@@ -103,11 +376,7 @@ class OverlayPreviewGraphicsItem(QGraphicsRectItem):
 
     def mouseReleaseEvent(self, event: QGraphicsSceneMouseEvent):
 
-        if event.button() is Qt.MouseButton.LeftButton:
-
-            self.isDragging = False
-            self.setPos(Math.gridSnap(self.x(), self.y(), self.parent.cellSize))
-            self.parent.updateItem(graphics=self)
+        if event.button() is Qt.MouseButton.LeftButton: self.parent.finishDrag(self)
 
         QApplication.instance().setOverrideCursor(Qt.CursorShape.OpenHandCursor)
         super().mouseReleaseEvent(event)
@@ -119,38 +388,56 @@ class OverlayPreviewGraphicsItem(QGraphicsRectItem):
 
         super().setRect(0, 0, size.x(), size.y())
         self.setPos(pos.x(), pos.y())
-        self.setImage(self.source())
+        self.geometryChanged()
+
+        if self.__deferred: self.setPlaceholder()
+        else: self.setImage(self.source())
     
     def paint(self, painter: QPainter, option, widget):
 
-        painter.drawImage(0, 0, self.image())
+        self.ensureImage()
+        if not self.paintText(painter): self.paintImage(painter)
+
         if self.isSelected(): 
             
             painter.setBrush(Qt.BrushStyle.NoBrush)
             painter.setPen(Qt.PenStyle.DashLine)
             painter.drawRect(self.rect().x(), self.rect().y(), self.rect().width(), self.rect().height())
 
+    def paintImage(self, painter: QPainter):
+
+        level = self.imageLevel(painter.worldTransform().m11())
+
+        if level is None: painter.drawImage(0, 0, self.image())
+        else:
+
+            # A pre-filtered level close to the on-screen size keeps zoomed views cheap and unaliased
+            painter.save()
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+            painter.drawImage(self.rect(), level)
+            painter.restore()
+
     def mouseMoveEvent(self, event: QGraphicsSceneMouseEvent):
 
         if not self.isDragging: return 
 
-        goalX = event.scenePos().x() - event.lastScenePos().x() + self.scenePos().x()
-        goalY = event.scenePos().y() - event.lastScenePos().y() + self.scenePos().y()
-
-        self.setX(Math.clamp(goalX, 0, self.parent.screenPreviewItem.width - self.rect().width()))
-        self.setY(Math.clamp(goalY, 0, self.parent.screenPreviewItem.height - self.rect().height()))
-        super().mouseMoveEvent(event)
+        delta = event.scenePos() - event.lastScenePos()
+        self.parent.dragItems(self, delta.x(), delta.y())
 
     def contextMenuEvent(self, event: QGraphicsSceneContextMenuEvent):
 
         contextMenu = QMenu(self.parent)
         deleteItem = contextMenu.addAction('Delete')
         renameItem = contextMenu.addAction('Rename')
+        layerActions = self.parent.addLayerMenu(contextMenu, self)
+        arrangeActions = self.parent.addArrangeMenus(contextMenu)
 
         deleteItem.setShortcut('Delete')
         action = contextMenu.exec(event.screenPos())
         
         if action is deleteItem: self.parent.deleteItem(graphics=self)
+        elif action in layerActions: layerActions[action]()
+        elif action in arrangeActions: arrangeActions[action]()
 
     def screenClamp(self, x, y, w, h) -> QPoint:
 
@@ -160,49 +447,106 @@ class OverlayPreviewGraphicsItem(QGraphicsRectItem):
             Math.clamp(y, 0, self.parent.screenPreviewItem.height - h)
         )
 
-class ScreenPreviewItem(QGraphicsItemGroup):
+class ScreenGridItem(QGraphicsItem):
+
+    # Constants
+    MIN_SPACING = 6
+    LOD_STEPS = (1, 4, 16, 64)
 
     def __init__(self, width: int, height: int, cellSize: int):
 
         super().__init__()
-        
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+
         self.width = width
-        self.height = height 
+        self.height = height
         self.cellSize = cellSize
-        screen = QGraphicsRectItem(0, 0, width, height)
-        screen.setBrush(QColor(Colors.GraySelected))
-        screen.setPen(QColor(Colors.GraySelected))
-        
-        self.addToGroup(screen)
-        self.drawGrid()
+        self.__lines: Dict[int, Tuple[List[QLineF], List[QLineF]]] = {}
 
-    def drawGrid(self):
+        color = QColor(Colors.White)
+        color.setAlphaF(0.2)
+        self.__pen = QPen(color)
+        self.__pen.setCosmetic(True)
 
-        # Vertical
-        for i in range(1, self.width // self.cellSize):
+        self.__axisPen = QPen(QColor(Colors.White))
+        self.__axisPen.setCosmetic(True)
 
-            x = i * self.cellSize
-            mid = self.width // self.cellSize // 2
+        midX = self.width // self.cellSize // 2 * self.cellSize
+        midY = self.height // self.cellSize // 2 * self.cellSize
+        self.__axes = [
 
-            line = QGraphicsLineItem(x, 0, x, self.height)    
-            if i == mid: line = QGraphicsLineItem(x, -self.cellSize, x, self.height + self.cellSize) 
-            else: line.setOpacity(0.2)
+            QLineF(midX, -self.cellSize, midX, self.height + self.cellSize),
+            QLineF(-self.cellSize, midY, self.width + self.cellSize, midY)
+        ]
 
-            line.setPen(QColor(Colors.White))
-            self.addToGroup(line)
+    def boundingRect(self) -> QRectF:
 
-        # Horizontal
-        for i in range(1, self.height // self.cellSize):
+        return QRectF(-self.cellSize, -self.cellSize, self.width + 2 * self.cellSize, self.height + 2 * self.cellSize)
 
-            y = i * self.cellSize
-            mid = self.height // self.cellSize // 2
+    def step(self, lod: float) -> int:
 
-            line = QGraphicsLineItem(0, y, self.width, y)
-            if i == mid: line = QGraphicsLineItem(-self.cellSize, y, self.width + self.cellSize, y)
-            else: line.setOpacity(0.2)
+        for step in self.LOD_STEPS:
+            if self.cellSize * step * lod >= self.MIN_SPACING: return step
 
-            line.setPen(QColor(Colors.White))
-            self.addToGroup(line)
+        return self.LOD_STEPS[-1]
+
+    def lines(self, step: int) -> Tuple[List[QLineF], List[QLineF]]:
+
+        lines = self.__lines.get(step)
+        if lines is not None: return lines
+
+        vertical = [QLineF(i * self.cellSize, 0, i * self.cellSize, self.height) for i in range(step, self.width // self.cellSize, step)]
+        horizontal = [QLineF(0, i * self.cellSize, self.width, i * self.cellSize) for i in range(step, self.height // self.cellSize, step)]
+
+        self.__lines[step] = (vertical, horizontal)
+        return self.__lines[step]
+
+    def visible(self, lines: List[QLineF], low: float, high: float, spacing: int) -> List[QLineF]:
+
+        # Line k sits at (k + 1) * spacing
+        first = max(0, math.ceil(low / spacing) - 2)
+        last = max(0, math.floor(high / spacing) + 1)
+
+        return lines[first:last]
+
+    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget):
+
+        step = self.step(option.levelOfDetailFromTransform(painter.worldTransform()))
+        spacing = self.cellSize * step
+        exposed = option.exposedRect
+        vertical, horizontal = self.lines(step)
+
+        painter.setPen(self.__pen)
+        painter.drawLines(self.visible(vertical, exposed.left(), exposed.right(), spacing))
+        painter.drawLines(self.visible(horizontal, exposed.top(), exposed.bottom(), spacing))
+
+        painter.setPen(self.__axisPen)
+        painter.drawLines(self.__axes)
+
+class ScreenPreviewItem(QGraphicsItemGroup):
+
+    def __init__(self, width: int, height: int, cellSize: int, screens: List[QRect] = None):
+
+        super().__init__()
+        
+        self.width = width
+        self.height = height 
+        self.cellSize = cellSize
+
+        # Each monitor is drawn on its own so gaps in the desktop stay visible
+        for rect in screens or [QRect(0, 0, width, height)]:
+
+            screen = QGraphicsRectItem(QRectF(rect))
+            screen.setBrush(QColor(Colors.GraySelected))
+            screen.setPen(QColor(Colors.GraySelected))
+            self.addToGroup(screen)
+
+        self.drawGrid()
+
+    def drawGrid(self):
+
+        self.grid = ScreenGridItem(self.width, self.height, self.cellSize)
+        self.addToGroup(self.grid)
 
 class OverlayFinalGraphicsItem(QGraphicsRectItem):
 
@@ -210,14 +554,35 @@ class OverlayFinalGraphicsItem(QGraphicsRectItem):
 
         self.__preview = preview 
         super().__init__()
+        self.setBrush(Qt.NoBrush)
+        self.setPen(Qt.NoPen)
+
+        self.setZValue(preview.zValue())
+        preview.link(self)
+        self.syncGeometry()
     
     def preview(self) -> OverlayPreviewGraphicsItem:
 
         return self.__preview
 
+    def image(self) -> QImage:
+
+        return self.preview().finalImage()
+
+    def layer(self) -> str:
+
+        return self.preview().layer()
+
+    def syncGeometry(self):
+
+        rect = self.preview().rect()
+        pos = self.preview().pos()
+
+        if rect != self.rect(): self.setRect(rect)
+        if pos != self.pos(): self.setPos(pos)
+
     def paint(self, painter: QPainter, option, widget):
         
-        x = self.preview().x()
-        y = self.preview().y()
-        
-        if self.preview().image() is not None: painter.drawImage(x, y, self.preview().image())
\ No newline at end of file
+        self.preview().ensureImage()
+        if self.preview().paintText(painter): return
+        if not self.image().isNull(): painter.drawImage(0, 0, self.image())
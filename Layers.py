@@ -0,0 +1,107 @@
+from typing import Dict, List
+
+from PySide6.QtCore import QObject, Signal
+from PySide6.QtGui import QKeySequence
+
+class OverlayLayer:
+
+    def __init__(self, name: str, z: int, hotkey: str = '', visible: bool = True):
+
+        self.name = name
+        self.z = z
+        self.hotkey = hotkey
+        self.visible = visible
+
+    def shortcut(self) -> QKeySequence:
+
+        return QKeySequence(self.hotkey)
+
+    def toDict(self) -> dict:
+
+        return {'name': self.name, 'z': self.z, 'hotkey': self.hotkey, 'visible': self.visible}
+
+class LayerRegistry(QObject):
+
+    # Signals
+    changed = Signal()
+    visibilityChanged = Signal(str)
+
+    # Constants
+    DEFAULT = 'Default'
+    DEFAULTS = (
+
+        (DEFAULT, 0, ''),
+        ('HUD', 10, 'Ctrl+1'),
+        ('Crosshair', 20, 'Ctrl+2'),
+        ('Stream Only', 30, 'Ctrl+3')
+    )
+
+    __instance = None
+
+    @staticmethod
+    def instance() -> 'LayerRegistry':
+
+        if LayerRegistry.__instance is None: LayerRegistry.__instance = LayerRegistry()
+        return LayerRegistry.__instance
+
+    def __init__(self):
+
+        super().__init__()
+        self.__layers: Dict[str, OverlayLayer] = {}
+        self.reset()
+
+    def reset(self):
+
+        self.__layers = {name: OverlayLayer(name, z, hotkey) for name, z, hotkey in self.DEFAULTS}
+        self.changed.emit()
+
+    def layers(self) -> List[OverlayLayer]:
+
+        return sorted(self.__layers.values(), key=lambda layer: layer.z)
+
+    def names(self) -> List[str]:
+
+        return [layer.name for layer in self.layers()]
+
+    def get(self, name: str) -> OverlayLayer:
+
+        # Items on a layer the layout no longer defines fall back to the default one
+        return self.__layers.get(name) or self.__layers[self.DEFAULT]
+
+    def isVisible(self, name: str) -> bool:
+
+        return self.get(name).visible
+
+    def setVisible(self, name: str, visible: bool):
+
+        layer = self.get(name)
+        if layer.visible == visible: return
+
+        layer.visible = visible
+        self.visibilityChanged.emit(layer.name)
+
+    def toggle(self, name: str):
+
+        self.setVisible(name, not self.isVisible(name))
+
+    def load(self, records: List[dict]):
+
+        layers = {}
+
+        for record in records:
+
+            try: layer = OverlayLayer(str(record['name']), int(record.get('z', 0)), str(record.get('hotkey', '')), record.get('visible', True))
+            except (KeyError, TypeError, ValueError): continue
+
+            # "false" is truthy, so anything but a real boolean is treated as a damaged record
+            if not isinstance(layer.visible, bool): continue
+            layers[layer.name] = layer
+
+        if self.DEFAULT not in layers: layers[self.DEFAULT] = OverlayLayer(self.DEFAULT, 0)
+
+        self.__layers = layers
+        self.changed.emit()
+
+    def toList(self) -> List[dict]:
+
+        return [layer.toDict() for layer in self.layers()]
@@ -0,0 +1,110 @@
+import json
+import os
+from typing import Iterable, Iterator, List, Optional
+
+from Models import OverlayItem
+
+class LayoutError(ValueError):
+
+    pass
+
+class LayoutFile:
+
+    # Constants
+    FORMAT = 'elayvate-layout'
+    VERSION = 1
+    EXTENSION = '.elay'
+    FILTER = 'Elayvate Layouts (*.elay)'
+    BATCH_SIZE = 256
+    FIELDS = ('id', 'name', 'source', 'x', 'y', 'width', 'height', 'layer')
+
+    def __init__(self, path: str):
+
+        self.path = path
+
+    def header(self, layers: List[dict] = None) -> dict:
+
+        header = {'format': self.FORMAT, 'version': self.VERSION}
+        if layers is not None: header['layers'] = layers
+
+        return header
+
+    def write(self, items: Iterable[OverlayItem], layers: List[dict] = None):
+
+        temp = self.path + '.tmp'
+
+        with open(temp, 'w', encoding='utf-8') as file:
+
+            file.write(json.dumps(self.header(layers)) + '\n')
+            for item in items: file.write(json.dumps({field: getattr(item, field) for field in self.FIELDS}) + '\n')
+
+        os.replace(temp, self.path)
+
+    def read(self) -> Iterator[OverlayItem]:
+
+        with open(self.path, 'r', encoding='utf-8') as file:
+
+            try:
+
+                self.checkHeader(file.readline())
+
+                for number, line in enumerate(file, start=2):
+
+                    if not line.strip(): continue
+
+                    try: record = json.loads(line)
+                    except ValueError as e: raise LayoutError('{}:{}: {}'.format(self.path, number, e))
+
+                    yield self.toItem(record, number)
+
+            except UnicodeDecodeError as e: raise LayoutError('{} is not an Elayvate layout: {}'.format(self.path, e))
+
+    def layers(self) -> Optional[List[dict]]:
+
+        with open(self.path, 'r', encoding='utf-8') as file:
+
+            try: layers = self.checkHeader(file.readline()).get('layers')
+            except UnicodeDecodeError: raise LayoutError('{} is not an Elayvate layout'.format(self.path))
+
+        return layers if isinstance(layers, list) else None
+
+    def checkHeader(self, line: str) -> dict:
+
+        try: header = json.loads(line)
+        except ValueError: raise LayoutError('{} is not an Elayvate layout'.format(self.path))
+
+        if not isinstance(header, dict) or header.get('format') != self.FORMAT: 
+            
+            raise LayoutError('{} is not an Elayvate layout'.format(self.path))
+
+        version = header.get('version', 0)
+        if not isinstance(version, int) or isinstance(version, bool):
+
+            raise LayoutError('{} has an invalid layout version {!r}'.format(self.path, version))
+
+        if version > self.VERSION: 
+            
+            raise LayoutError('{} was saved by a newer version (layout v{})'.format(self.path, header.get('version')))
+
+        return header
+
+    def toItem(self, record: dict, number: int = 0) -> OverlayItem:
+
+        if not isinstance(record, dict): raise LayoutError('{}:{}: expected an item object'.format(self.path, number))
+
+        item = OverlayItem()
+
+        try:
+
+            item.id = int(record.get('id', 0))
+            item.name = str(record.get('name', 'Image'))
+            item.source = str(record.get('source', ''))
+            item.x = int(record.get('x', 0))
+            item.y = int(record.get('y', 0))
+            item.width = int(record.get('width', 0))
+            item.height = int(record.get('height', 0))
+            item.layer = str(record.get('layer', ''))
+
+        except (TypeError, ValueError, OverflowError) as e: raise LayoutError('{}:{}: {}'.format(self.path, number, e))
+
+        return item
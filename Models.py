@@ -1,16 +1,18 @@
-from typing import Callable
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from PySide6.QtGui import QAction
 
 from Items import OverlayFinalGraphicsItem, OverlayPreviewGraphicsItem, OverlayListWidgetItem
 
 class OverlayItem():
 
+    id: int = 0
     name: str = ''
     source: str = ''
     x: int = 0
     y: int = 0
     width: int = 0
     height: int = 0
+    layer: str = ''
 
     def __init__(self):
 
@@ -33,16 +35,25 @@ class CallableActionProxy:
 
 class OverlayItemProxy():
 
+    __nextId = 1
     __listWidgetItem: OverlayListWidgetItem
     __previewGraphicsItem: OverlayPreviewGraphicsItem
     __finalGraphicsItem: OverlayFinalGraphicsItem
 
-    def __init__(self):
+    def __init__(self, id: int = None):
+
+        if id is None: id = OverlayItemProxy.__nextId
+        OverlayItemProxy.__nextId = max(OverlayItemProxy.__nextId, id + 1)
 
+        self.__id = id
         self.__listWidgetItem = None
         self.__previewGraphicsItem = None
         self.__finalGraphicsItem = None
 
+    def id(self) -> int:
+
+        return self.__id
+
     def listWidgetItem(self) -> OverlayListWidgetItem: 
         
         return self.__listWidgetItem
@@ -75,6 +86,35 @@ class OverlayItemProxy():
 
         return self.__previewGraphicsItem.source()
 
+    def layer(self) -> str:
+
+        return self.__previewGraphicsItem.layer()
+
+    def geometry(self) -> Tuple[int, int, int, int]:
+
+        return self.__previewGraphicsItem.geometry()
+
+    def isVisible(self) -> bool:
+
+        return self.__finalGraphicsItem.isVisible()
+
+    def name(self) -> str:
+
+        return self.__listWidgetItem.text()
+
+    def model(self) -> OverlayItem:
+
+        item = OverlayItem()
+        item.id = self.id()
+        item.name = self.name()
+        item.source = self.source()
+        item.x = int(self.x())
+        item.y = int(self.y())
+        item.width = int(self.width())
+        item.height = int(self.height())
+        item.layer = self.layer()
+        return item
+
     def setListWidgetItem(self, widget: OverlayListWidgetItem):
 
         self.__listWidgetItem = widget
@@ -98,6 +138,66 @@ class OverlayItemProxy():
 
         self.__previewGraphicsItem.setSource(source)
 
+    def setLayer(self, name: str):
+
+        self.__previewGraphicsItem.setLayer(name)
+
+    def setVisible(self, visible: bool):
+
+        # Only the overlay hides; the editor keeps showing the item so it can still be arranged
+        if visible != self.__finalGraphicsItem.isVisible(): self.__finalGraphicsItem.setVisible(visible)
+
     def setRect(self, x: float, y: float, width: float, height: float):
 
         self.__previewGraphicsItem.setRect(x, y, width, height)
+
+class OverlayItemRegistry():
+
+    def __init__(self):
+
+        self.__byId: Dict[int, OverlayItemProxy] = {}
+        self.__byItem: Dict[int, OverlayItemProxy] = {}
+
+    def __len__(self) -> int:
+
+        return len(self.__byId)
+
+    def __iter__(self) -> Iterator[OverlayItemProxy]:
+
+        return iter(list(self.__byId.values()))
+
+    def __contains__(self, proxy: OverlayItemProxy) -> bool:
+
+        return isinstance(proxy, OverlayItemProxy) and self.__byId.get(proxy.id()) is proxy
+
+    def items(self, proxy: OverlayItemProxy) -> List[object]:
+
+        items = [proxy.listWidgetItem(), proxy.previewGraphicsItem(), proxy.finalGraphicsItem()]
+        return [item for item in items if item is not None]
+
+    def add(self, proxy: OverlayItemProxy):
+
+        self.__byId[proxy.id()] = proxy
+        for item in self.items(proxy): self.__byItem[id(item)] = proxy
+
+    def remove(self, proxy: OverlayItemProxy):
+
+        if self.__byId.pop(proxy.id(), None) is None: return
+        for item in self.items(proxy): self.__byItem.pop(id(item), None)
+
+    def removeMany(self, proxies: Iterable[OverlayItemProxy]):
+
+        for proxy in proxies: self.remove(proxy)
+
+    def clear(self):
+
+        self.__byId.clear()
+        self.__byItem.clear()
+
+    def get(self, object) -> Optional[OverlayItemProxy]:
+
+        return self.__byItem.get(id(object))
+
+    def byId(self, id: int) -> Optional[OverlayItemProxy]:
+
+        return self.__byId.get(id)
@@ -0,0 +1,138 @@
+import sys
+import time
+from collections import deque
+from typing import Callable, Dict, List, Tuple
+
+class StartupProfiler:
+
+    def __init__(self, started: float):
+
+        self.started = started
+        self.phases: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str):
+
+        self.phases.append((phase, time.perf_counter()))
+
+    def report(self, stream = sys.stderr):
+
+        previous = self.started
+        print('startup phase          phase ms   total ms', file=stream)
+
+        for phase, stamp in self.phases:
+
+            print('{:<20} {:>10.1f} {:>10.1f}'.format(phase, (stamp - previous) * 1000, (stamp - self.started) * 1000), file=stream)
+            previous = stamp
+
+class FrameProfiler:
+
+    # Constants
+    WINDOW = 240
+    ITEM_WINDOW = 2.0
+
+    # Every overlay window has its own profiler, so each class is patched once and shared
+    __originals: Dict[type, Callable] = {}
+    __profilers: Dict[type, List['FrameProfiler']] = {}
+
+    def __init__(self):
+
+        self.frames = deque(maxlen=self.WINDOW)
+        self.stamps = deque()
+        self.dirty = 0
+        self.__inFrame = False
+        self.__painted = 0
+        self.__frameStart = 0.0
+        self.__items: Dict[int, List] = {}
+        self.__classes: List[type] = []
+
+    def isInstalled(self) -> bool:
+
+        return bool(self.__classes)
+
+    def install(self, *classes: type):
+
+        for cls in classes:
+
+            if cls in self.__classes: continue
+
+            profilers = FrameProfiler.__profilers.setdefault(cls, [])
+            if not profilers:
+
+                FrameProfiler.__originals[cls] = cls.paint
+                cls.paint = FrameProfiler.timed(cls.paint, cls.__name__, profilers)
+
+            profilers.append(self)
+            self.__classes.append(cls)
+
+    def uninstall(self):
+
+        # The last profiler out puts the class's own paint back
+        for cls in self.__classes:
+
+            profilers = FrameProfiler.__profilers[cls]
+            profilers.remove(self)
+            if profilers: continue
+
+            cls.paint = FrameProfiler.__originals.pop(cls)
+            del FrameProfiler.__profilers[cls]
+
+        self.__classes.clear()
+        self.__items.clear()
+
+    @staticmethod
+    def timed(paint: Callable, kind: str, profilers: List['FrameProfiler']) -> Callable:
+
+        def timedPaint(item, painter, option, widget):
+
+            start = time.perf_counter()
+            paint(item, painter, option, widget)
+            seconds = time.perf_counter() - start
+            for profiler in profilers: profiler.recordItem(item, kind, seconds)
+
+        return timedPaint
+
+    def recordItem(self, item, kind: str, seconds: float):
+
+        record = self.__items.get(id(item))
+        if record is None: record = self.__items[id(item)] = [item, kind, 0.0, 0, 0.0]
+
+        record[2] += seconds
+        record[3] += 1
+        record[4] = time.perf_counter()
+        if self.__inFrame and kind == 'OverlayFinalGraphicsItem': self.__painted += 1
+
+    def beginFrame(self):
+
+        self.__inFrame = True
+        self.__painted = 0
+        self.__frameStart = time.perf_counter()
+
+    def endFrame(self):
+
+        now = time.perf_counter()
+        self.__inFrame = False
+        self.frames.append(now - self.__frameStart)
+        self.stamps.append(now)
+        self.dirty = self.__painted
+
+    def percentile(self, p: float) -> float:
+
+        if not self.frames: return 0.0
+
+        ordered = sorted(self.frames)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    def rate(self) -> int:
+
+        cutoff = time.perf_counter() - 1.0
+        while self.stamps and self.stamps[0] < cutoff: self.stamps.popleft()
+
+        return len(self.stamps)
+
+    def slowest(self, count: int = 5) -> List[Tuple[object, str, float]]:
+
+        cutoff = time.perf_counter() - self.ITEM_WINDOW
+        for key in [key for key, record in self.__items.items() if record[4] < cutoff]: del self.__items[key]
+
+        records = sorted(self.__items.values(), key=lambda record: record[2] / record[3], reverse=True)
+        return [(record[0], record[1], record[2] / record[3]) for record in records[:count]]
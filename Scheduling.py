@@ -0,0 +1,75 @@
+from typing import Callable, Dict, Hashable
+
+from PySide6.QtCore import QElapsedTimer, QObject, Qt, QTimer
+from PySide6.QtGui import QGuiApplication
+
+class OverlayUpdateScheduler(QObject):
+
+    # Constants
+    FALLBACK_RATE = 60.0
+
+    __instance = None
+
+    @staticmethod
+    def instance() -> 'OverlayUpdateScheduler':
+
+        if OverlayUpdateScheduler.__instance is None: OverlayUpdateScheduler.__instance = OverlayUpdateScheduler()
+        return OverlayUpdateScheduler.__instance
+
+    def __init__(self):
+
+        super().__init__()
+        self.maxRate = 0.0
+        self.flushes = 0
+        self.__pending: Dict[Hashable, Callable] = {}
+        self.__clock = QElapsedTimer()
+        self.__clock.start()
+        self.__lastFlush = -1.0
+
+        self.__timer = QTimer(self)
+        self.__timer.setSingleShot(True)
+        self.__timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.__timer.timeout.connect(self.flush)
+
+    def setMaxRate(self, rate: float):
+
+        self.maxRate = max(0.0, rate)
+
+    def rate(self) -> float:
+
+        screen = QGuiApplication.primaryScreen()
+        refresh = screen.refreshRate() if screen is not None else 0.0
+        if refresh <= 0: refresh = self.FALLBACK_RATE
+
+        return min(refresh, self.maxRate) if self.maxRate > 0 else refresh
+
+    def interval(self) -> float:
+
+        return 1000.0 / self.rate()
+
+    def schedule(self, key: Hashable, callback: Callable):
+
+        self.__pending[key] = callback
+        if self.__timer.isActive(): return
+
+        elapsed = self.__clock.elapsed() - self.__lastFlush
+        self.__timer.start(max(0, round(self.interval() - elapsed)))
+
+    def cancel(self, key: Hashable):
+
+        self.__pending.pop(key, None)
+        if not self.__pending: self.__timer.stop()
+
+    def pending(self) -> int:
+
+        return len(self.__pending)
+
+    def flush(self):
+
+        self.__timer.stop()
+        self.__lastFlush = self.__clock.elapsed()
+        if not self.__pending: return
+
+        pending, self.__pending = self.__pending, {}
+        for callback in pending.values(): callback()
+        self.flushes += 1
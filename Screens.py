@@ -0,0 +1,70 @@
+from typing import List
+
+from PySide6.QtCore import QObject, QPoint, QRect, QTimer, Signal
+from PySide6.QtGui import QGuiApplication, QScreen
+
+class VirtualDesktop(QObject):
+
+    # Signals
+    changed = Signal()
+
+    __instance = None
+
+    @staticmethod
+    def instance() -> 'VirtualDesktop':
+
+        if VirtualDesktop.__instance is None: VirtualDesktop.__instance = VirtualDesktop()
+        return VirtualDesktop.__instance
+
+    def __init__(self):
+
+        super().__init__()
+        app = QGuiApplication.instance()
+
+        # Screen changes arrive in bursts, so settle them into one notification
+        self.__timer = QTimer(self)
+        self.__timer.setSingleShot(True)
+        self.__timer.setInterval(0)
+        self.__timer.timeout.connect(self.changed.emit)
+
+        app.screenAdded.connect(self.onScreenAdded)
+        app.screenRemoved.connect(self.onScreenRemoved)
+        for screen in app.screens(): self.watch(screen)
+
+    def watch(self, screen: QScreen):
+
+        screen.geometryChanged.connect(self.__timer.start)
+
+    def onScreenAdded(self, screen: QScreen):
+
+        self.watch(screen)
+        self.__timer.start()
+
+    def onScreenRemoved(self, screen: QScreen):
+
+        self.__timer.start()
+
+    def screens(self) -> List[QScreen]:
+
+        return QGuiApplication.screens()
+
+    def geometry(self) -> QRect:
+
+        rect = QRect()
+        for screen in self.screens(): rect = rect.united(screen.geometry())
+
+        return rect
+
+    def origin(self) -> QPoint:
+
+        return self.geometry().topLeft()
+
+    def screenRect(self, screen: QScreen) -> QRect:
+
+        # Layouts place items relative to the top-left of the whole desktop
+        return screen.geometry().translated(-self.origin())
+
+    def screenRects(self) -> List[QRect]:
+
+        origin = self.origin()
+        return [screen.geometry().translated(-origin) for screen in self.screens()]
@@ -0,0 +1,237 @@
+import os
+import re
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+
+from PySide6.QtCore import QObject, QRunnable, Qt, Signal
+
+from Animations import AnimationClock
+from Images import ImageLoader
+
+TextPart = Union[str, Tuple[str, str]]
+
+# The session timer counts from startup, not from the first text item
+SESSION_STARTED = time.monotonic()
+
+class DynamicText:
+
+    # Constants
+    FIELD = re.compile(r'\{\{|\}\}|\{(\w+)(?::([^}]*))?\}')
+    FIELDS = ('clock', 'elapsed', 'file')
+    CLOCK_FORMAT = '%H:%M:%S'
+    SECOND = 1000
+    FILE_POLL = 500
+
+    def __init__(self, store: 'TextStore', source: str):
+
+        self.store = store
+        self.source = source
+        self.refs = 0
+        self.parts = self.parse(source[len(TextStore.SCHEME):])
+        self.fields = set(part[0] for part in self.parts if isinstance(part, tuple))
+        self.files = set(part[1] for part in self.parts if isinstance(part, tuple) and part[0] == 'file')
+        self.__subscribers: Dict[int, Callable] = {}
+        self.value = self.format()
+
+    def parse(self, template: str) -> List[TextPart]:
+
+        parts: List[TextPart] = []
+        last = 0
+
+        for match in self.FIELD.finditer(template):
+
+            # Doubled braces are literal, the same as in str.format
+            escaped = match.group(1) is None
+            if not escaped and match.group(1) not in self.FIELDS: continue
+
+            if match.start() > last: parts.append(template[last:match.start()])
+            parts.append(match.group(0)[0] if escaped else (match.group(1), match.group(2) or ''))
+            last = match.end()
+
+        if last < len(template): parts.append(template[last:])
+        return parts
+
+    def isDynamic(self) -> bool:
+
+        return bool(self.fields)
+
+    def subscribe(self, key: int, callback: Callable):
+
+        # A text nobody watched may be stale, so catch up before the first paint
+        if not self.__subscribers:
+
+            self.poll()
+            self.value = self.format()
+
+        self.__subscribers[key] = callback
+        if self.isDynamic(): AnimationClock.instance().add(self)
+
+    def unsubscribe(self, key: int):
+
+        self.__subscribers.pop(key, None)
+        if not self.__subscribers: AnimationClock.instance().remove(self)
+
+    def stop(self):
+
+        AnimationClock.instance().remove(self)
+        self.__subscribers.clear()
+
+    def notify(self):
+
+        for callback in list(self.__subscribers.values()): callback()
+
+    def msecsToNext(self, elapsed: int) -> int:
+
+        # Waking on the wall-clock second keeps every text on the same tick
+        wait = self.SECOND - int(time.time() * 1000) % self.SECOND
+        if 'file' in self.fields: wait = min(wait, self.FILE_POLL - elapsed % self.FILE_POLL)
+
+        return wait
+
+    def advance(self, elapsed: int):
+
+        self.poll()
+        self.refresh()
+
+    def poll(self):
+
+        for path in self.files: self.store.pollFile(path)
+
+    def refresh(self):
+
+        value = self.format()
+        if value == self.value: return
+
+        self.value = value
+        self.notify()
+
+    def format(self) -> str:
+
+        return ''.join(part if isinstance(part, str) else self.field(*part) for part in self.parts)
+
+    def field(self, name: str, argument: str) -> str:
+
+        if name == 'clock': return time.strftime(argument or self.CLOCK_FORMAT)
+        if name == 'file': return self.store.fileText(argument)
+
+        seconds = int(time.monotonic() - self.store.started)
+        return '{}:{:02d}:{:02d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+class TextFileTask(QRunnable):
+
+    # Constants
+    LIMIT = 256
+
+    def __init__(self, store: 'TextStore', path: str, stamp: Optional[Tuple[int, int]]):
+
+        super().__init__()
+        self.store = store
+        self.path = path
+        self.stamp = stamp
+
+    def run(self):
+
+        # Polling is a stat; the file is only read again once it has changed
+        try:
+
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            value = ''
+
+            if stamp != self.stamp:
+                with open(self.path, 'r', encoding='utf-8', errors='replace') as file: value = file.read(self.LIMIT)
+
+        except OSError: stamp, value = None, ''
+
+        value = value.splitlines()[0].strip() if value.strip() else ''
+        self.store.fileRead.emit(self.path, (stamp, value) if stamp != self.stamp else None)
+
+class TextStore(QObject):
+
+    # Signals
+    fileRead = Signal(str, object)
+
+    # Constants
+    SCHEME = 'text:'
+    DEFAULT_TEMPLATE = '{clock}'
+    HELP = 'Text with {clock} or {clock:%H:%M}, {elapsed} and {file:path} fields:'
+
+    __instance = None
+
+    @staticmethod
+    def instance() -> 'TextStore':
+
+        if TextStore.__instance is None: TextStore.__instance = TextStore()
+        return TextStore.__instance
+
+    @staticmethod
+    def isText(source: str) -> bool:
+
+        return source.startswith(TextStore.SCHEME)
+
+    @staticmethod
+    def escape(value: str) -> str:
+
+        return value.replace('{', '{{').replace('}', '}}')
+
+    def __init__(self):
+
+        super().__init__()
+        self.started = SESSION_STARTED
+        self.__texts: Dict[str, DynamicText] = {}
+        self.__files: Dict[str, Tuple[Optional[Tuple[int, int]], str]] = {}
+        self.__reading: Set[str] = set()
+        self.fileRead.connect(self.onFileRead, Qt.ConnectionType.QueuedConnection)
+
+    def acquire(self, source: str) -> Optional[DynamicText]:
+
+        if not self.isText(source): return None
+
+        # Items showing the same template share one value and one clock slot
+        text = self.__texts.get(source)
+        if text is None: text = self.__texts[source] = DynamicText(self, source)
+
+        text.refs += 1
+        return text
+
+    def release(self, text: Optional[DynamicText], key: int):
+
+        if text is None: return
+
+        text.unsubscribe(key)
+        text.refs -= 1
+        if text.refs > 0: return
+
+        text.stop()
+        if self.__texts.get(text.source) is text: del self.__texts[text.source]
+
+        # File contents are kept only while some text still shows them
+        used = set().union(*(other.files for other in self.__texts.values()))
+        for path in text.files - used: self.__files.pop(path, None)
+
+    def count(self) -> int:
+
+        return len(self.__texts)
+
+    def fileText(self, path: str) -> str:
+
+        cached = self.__files.get(path)
+        return cached[1] if cached is not None else ''
+
+    def pollFile(self, path: str):
+
+        # Files are read on the decode pool; the GUI thread only ever sees the cached first line
+        if path in self.__reading: return
+
+        cached = self.__files.get(path)
+        self.__reading.add(path)
+        ImageLoader.instance().pool.start(TextFileTask(self, path, cached[0] if cached is not None else (-1, -1)))
+
+    def onFileRead(self, path: str, result: Optional[Tuple[Optional[Tuple[int, int]], str]]):
+
+        self.__reading.discard(path)
+        if result is None or path not in set().union(*(text.files for text in self.__texts.values())): return
+
+        self.__files[path] = result
+        for text in list(self.__texts.values()):
+            if path in text.files: text.refresh()
@@ -1,12 +1,18 @@
+import os
+from contextlib import contextmanager
 from types import NoneType
-from typing import Callable, Dict, List
-from Items import OverlayPreviewGraphicsItem, OverlayListWidgetItem, ScreenPreviewItem
+from typing import Callable, Dict, List, Tuple
+from Items import OverlayFinalGraphicsItem, OverlayPreviewGraphicsItem, OverlayListWidgetItem, ScreenPreviewItem
 from Globals import Colors, Math, Style
-from Models import OverlayItemProxy, CallableActionProxy
+from Layers import LayerRegistry
+from Models import OverlayItem, OverlayItemProxy, CallableActionProxy
+from Profiling import FrameProfiler
+from Screens import VirtualDesktop
+from Texts import TextStore
 
-from PySide6.QtCore import QEvent, QPoint, Qt, Signal
-from PySide6.QtWidgets import QApplication, QFileDialog, QFrame, QGraphicsRectItem, QGraphicsScene, QGraphicsView, QGridLayout, QLabel, QLineEdit, QListWidget, QMenu, QVBoxLayout, QWidget
-from PySide6.QtGui import QAction, QContextMenuEvent, QKeyEvent, QMouseEvent, QResizeEvent
+from PySide6.QtCore import QEvent, QItemSelectionModel, QPoint, QRect, QRectF, Qt, QTimer, Signal
+from PySide6.QtWidgets import QAbstractItemView, QApplication, QFileDialog, QFrame, QGraphicsItem, QGraphicsRectItem, QGraphicsScene, QGraphicsView, QGridLayout, QInputDialog, QLabel, QLineEdit, QListWidget, QMenu, QStyleOptionGraphicsItem, QVBoxLayout, QWidget
+from PySide6.QtGui import QAction, QColor, QContextMenuEvent, QImage, QKeyEvent, QMouseEvent, QPainter, QPaintEvent, QRegion, QResizeEvent, QTransform
 
 class PropertyLineEdit(QLineEdit):
     
@@ -83,29 +89,274 @@ class BrowseLineEdit(ClickableLineEdit):
 
 class EGraphicsView(QGraphicsView):
 
-        def __init__(self, parent: QWidget):
+        # Constants
+        FLASH_MSECS = 150
+        FLASH_COLOR = QColor(255, 0, 0, 96)
+
+        def __init__(self, parent: QWidget, scene: QGraphicsScene = None):
 
             super().__init__(parent)
-            scene = QGraphicsScene()
+            self.debugDamage = False
+            self.profiler = None
+            self.__clearingFlash = False
+
+            # Views sharing a scene frame their own part of it with setSceneRect
+            shared = scene is not None
+            if not shared: scene = QGraphicsScene()
             self.setScene(scene)
             self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
             self.setResizeAnchor(QGraphicsView.AnchorUnderMouse)
             self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
             self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
             self.setFrameShape(QFrame.NoFrame)
+            if shared: return
 
-            screen = QGraphicsRectItem(0, 0, self.screen().size().width(), self.screen().size().height())
+            size = VirtualDesktop.instance().geometry().size()
+            screen = QGraphicsRectItem(0, 0, size.width(), size.height())
             screen.setBrush(Qt.NoBrush)
             screen.setPen(Qt.NoPen)
+            screen.setFlag(QGraphicsItem.ItemHasNoContents, True)
             self.scene().addItem(screen)
 
+        def setDebugDamage(self, enabled: bool):
+
+            self.debugDamage = enabled
+            self.viewport().update()
+
+        def paintEvent(self, event: QPaintEvent):
+
+            if self.profiler is None: self.paintContents(event)
+            else:
+
+                self.profiler.beginFrame()
+                self.paintContents(event)
+                self.profiler.endFrame()
+
+            if not self.debugDamage or self.__clearingFlash: return
+
+            painter = QPainter(self.viewport())
+            for rect in event.region(): painter.fillRect(rect, self.FLASH_COLOR)
+            painter.end()
+
+            rects = list(event.region())
+            QTimer.singleShot(self.FLASH_MSECS, lambda: self.clearFlash(rects))
+
+        def paintContents(self, event: QPaintEvent):
+
+            super().paintEvent(event)
+
+        def clearFlash(self, rects: List[QRect]):
+
+            self.__clearingFlash = True
+            for rect in rects: self.viewport().repaint(rect)
+            self.__clearingFlash = False
+
+        @contextmanager
+        def bulkUpdate(self):
+
+            self.setUpdatesEnabled(False)
+            self.scene().setItemIndexMethod(QGraphicsScene.NoIndex)
+
+            try: yield
+
+            finally:
+
+                self.scene().setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+                self.setUpdatesEnabled(True)
+                self.viewport().update()
+
+class OverlayGraphicsView(EGraphicsView):
+
+        # Constants
+        FORMAT = QImage.Format.Format_ARGB32_Premultiplied
+        MAX_DIRTY_RECTS = 16
+
+        def __init__(self, parent: QWidget, scene: QGraphicsScene):
+
+            super().__init__(parent, scene)
+            self.rebuilt = 0
+            self.__bounds = QRect()
+            self.__backings: Dict[str, QImage] = {}
+            self.__dirty = QRegion()
+
+            # Listening to changed makes the scene report every damaged rect, moves included
+            scene.changed.connect(self.onSceneChanged)
+
+            # Toggling a layer only changes which cached composites are blitted
+            layers = LayerRegistry.instance()
+            layers.visibilityChanged.connect(self.viewport().update)
+            layers.changed.connect(self.viewport().update)
+
+        def setSceneRect(self, rect: QRectF):
+
+            super().setSceneRect(rect)
+            self.__bounds = QRect(QPoint(0, 0), rect.size().toSize())
+            self.__backings.clear()
+            self.__dirty = QRegion(self.__bounds)
+
+        def backing(self, layer: str) -> QImage:
+
+            # Each layer keeps its own composite, created once the layer has something on this screen
+            backing = self.__backings.get(layer)
+
+            if backing is None:
+
+                backing = self.__backings[layer] = QImage(self.__bounds.size(), self.FORMAT)
+                backing.fill(0)
+
+            return backing
+
+        def onSceneChanged(self, rects: List[QRectF]):
+
+            origin = self.sceneRect().topLeft()
+
+            for rect in rects:
+
+                rect = rect.translated(-origin).toAlignedRect().adjusted(-1, -1, 1, 1) & self.__bounds
+                if not rect.isEmpty(): self.__dirty += rect
+
+        def beginRect(self, painter: QPainter, rect: QRect):
+
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+            painter.resetTransform()
+            painter.setClipRect(rect)
+            painter.fillRect(rect, Qt.GlobalColor.transparent)
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceOver)
+
+        def rebuild(self):
+
+            if self.__dirty.isEmpty(): return
+
+            origin = self.sceneRect().topLeft()
+            offset = QTransform.fromTranslate(-origin.x(), -origin.y())
+            option = QStyleOptionGraphicsItem()
+            painters = {layer: QPainter(backing) for layer, backing in self.__backings.items()}
+
+            # Scattered damage from a batch of moves is cheaper to rebuild as one rect than item by item per rect
+            rects = [self.__dirty.boundingRect()] if self.__dirty.rectCount() > self.MAX_DIRTY_RECTS else list(self.__dirty)
+
+            for rect in rects:
+
+                # Clear the rect on every layer, then repaint just the static items under it in stacking order
+                for painter in painters.values(): self.beginRect(painter, rect)
+
+                sceneRect = QRectF(rect).translated(origin)
+                for item in self.scene().items(sceneRect, Qt.ItemSelectionMode.IntersectsItemBoundingRect, Qt.SortOrder.AscendingOrder):
+
+                    if not isinstance(item, OverlayFinalGraphicsItem) or not item.isVisible(): continue
+
+                    painter = painters.get(item.layer())
+                    if painter is None:
+
+                        painter = painters[item.layer()] = QPainter(self.backing(item.layer()))
+                        self.beginRect(painter, rect)
+
+                    option.exposedRect = item.mapRectFromScene(sceneRect)
+                    painter.setTransform(item.sceneTransform() * offset)
+                    item.paint(painter, option, None)
+
+                self.rebuilt += 1
+
+            for painter in painters.values(): painter.end()
+            self.__dirty = QRegion()
+
+        def paintContents(self, event: QPaintEvent):
+
+            # Repaints blit the composites; only damaged rects ever touch the items
+            self.rebuild()
+
+            backings = [self.__backings[layer.name] for layer in LayerRegistry.instance().layers() if layer.visible and layer.name in self.__backings]
+            painter = QPainter(self.viewport())
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+
+            if not backings:
+                for rect in event.region(): painter.fillRect(rect, Qt.GlobalColor.transparent)
+
+            for backing in backings:
+
+                for rect in event.region(): painter.drawImage(rect, backing, rect)
+                painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceOver)
+
+            painter.end()
+
+class FrameTimingHud(QLabel):
+
+    # Constants
+    REFRESH_MSECS = 250
+    SLOWEST = 5
+
+    def __init__(self, parent: QWidget, view: EGraphicsView):
+
+        super().__init__(parent)
+        self.view = view
+        self.profiler = FrameProfiler()
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.REFRESH_MSECS)
+        self.timer.timeout.connect(self.refresh)
+
+        self.setAttribute(Qt.WA_TransparentForMouseEvents, True)
+        self.setAutoFillBackground(True)
+        self.setStyleSheet(Style.FrameTimingHud)
+        self.move(10, 10)
+        self.hide()
+
+    def isActive(self) -> bool:
+
+        return self.timer.isActive()
+
+    def setActive(self, active: bool):
+
+        if active:
+
+            self.profiler.install(OverlayFinalGraphicsItem, OverlayPreviewGraphicsItem)
+            self.view.profiler = self.profiler
+            self.timer.start()
+            self.refresh()
+            self.show()
+            self.raise_()
+
+        else:
+
+            self.timer.stop()
+            self.view.profiler = None
+            self.profiler.uninstall()
+            self.hide()
+
+    def describe(self, item) -> str:
+
+        preview = item.preview() if isinstance(item, OverlayFinalGraphicsItem) else item
+        kind = 'overlay' if isinstance(item, OverlayFinalGraphicsItem) else 'editor'
+        name = os.path.basename(preview.source()) or '(no source)'
+
+        return '{} {} @ {:.0f},{:.0f}'.format(kind, name, item.x(), item.y())
+
+    def refresh(self):
+
+        lines = [
+
+            'frame  p50 {:7.3f} ms  p99 {:7.3f} ms'.format(self.profiler.percentile(0.5) * 1000, self.profiler.percentile(0.99) * 1000),
+            'repaints/s {:4d}   dirty items {:4d}'.format(self.profiler.rate(), self.profiler.dirty),
+            'slowest paints:'
+        ]
+
+        for item, _, seconds in self.profiler.slowest(self.SLOWEST): lines.append('  {:7.3f} ms  {}'.format(seconds * 1000, self.describe(item)))
+
+        self.setText('\n'.join(lines))
+        self.adjustSize()
+
 class OverlayWidget(QWidget):
 
     # Signals
     itemAdded = Signal(object)
     itemDeleted = Signal(object)
+    itemsDeleted = Signal(object)
     itemChanged = Signal(object)
-    itemSelected = Signal(object, bool)
+    itemsChanged = Signal(object)
+    selectionChanged = Signal(object)
+    geometryEdited = Signal(object, str)
+    sourceEdited = Signal(object, str, str)
+    layerEdited = Signal(object)
+    filesDropped = Signal(object, object)
 
     def __init__(self, parent: QWidget):
 
@@ -115,6 +366,13 @@ class OverlayPreviewWidget(OverlayWidget):
 
     # Constants
     ZOOM_FACTOR = 1.25
+    NUDGE_KEYS = {
+
+        Qt.Key.Key_Left: (-1, 0),
+        Qt.Key.Key_Right: (1, 0),
+        Qt.Key.Key_Up: (0, -1),
+        Qt.Key.Key_Down: (0, 1)
+    }
 
     def __init__(self, parent: QWidget):
 
@@ -122,10 +380,18 @@ class OverlayPreviewWidget(OverlayWidget):
 
         self.isMoving = False
         self.view = EGraphicsView(self)
+        self.view.setDragMode(QGraphicsView.DragMode.RubberBandDrag)
+        self.__dragging: List[OverlayPreviewGraphicsItem] = []
+        self.__dragOrigins: List[Tuple[int, int, int, int]] = []
+        self.__settingSelection = False
+        self.screenPreviewItem = None
 
+        self.view.installEventFilter(self)
         self.view.viewport().installEventFilter(self)
+        self.view.scene().selectionChanged.connect(self.onSelectionChanged)
         self.setStyleSheet('background: {}'.format(Colors.MenuDark))
         self.drawScreenPreview()
+        VirtualDesktop.instance().changed.connect(self.drawScreenPreview)
         
     def eventFilter(self, source, e: QEvent) -> bool:
 
@@ -133,6 +399,25 @@ class OverlayPreviewWidget(OverlayWidget):
         elif e.type() == QEvent.Type.MouseButtonRelease: self.mouseReleaseEvent(e)
         elif e.type() == QEvent.Type.MouseMove: self.mouseMoveEvent(e)
 
+        elif e.type() in (QEvent.Type.DragEnter, QEvent.Type.DragMove) and e.mimeData().hasUrls():
+
+            e.acceptProposedAction()
+            return True
+
+        elif e.type() == QEvent.Type.Drop and e.mimeData().hasUrls():
+
+            paths = [url.toLocalFile() for url in e.mimeData().urls() if url.isLocalFile()]
+            e.acceptProposedAction()
+            if paths: self.filesDropped.emit(paths, self.view.mapToScene(e.position().toPoint()))
+            return True
+
+        # Arrow keys would otherwise scroll the view
+        elif e.type() == QEvent.Type.KeyPress and source is self.view and e.key() in self.NUDGE_KEYS:
+
+            dx, dy = self.NUDGE_KEYS[e.key()]
+            self.nudgeSelection(dx * self.cellSize, dy * self.cellSize)
+            return True
+
         return super().eventFilter(source, e)
 
     def resizeEvent(self, e: QResizeEvent):
@@ -160,6 +445,7 @@ class OverlayPreviewWidget(OverlayWidget):
         viewMenu = contextMenu.addMenu('View')
 
         newImage = newMenu.addAction('Image')
+        newText = newMenu.addAction('Text...')
         zoomIn = viewMenu.addAction('Zoom In')
         zoomOut = viewMenu.addAction('Zoom Out')
         fillWindow = viewMenu.addAction('Fill Window')
@@ -171,6 +457,7 @@ class OverlayPreviewWidget(OverlayWidget):
         action = contextMenu.exec(self.mapToGlobal(e.pos()))
         
         if   action is newImage: self.addItem(position=e.pos())
+        elif action is newText: self.addText(e.pos())
         elif action is zoomIn: self.zoomIn()
         elif action is zoomOut: self.zoomOut()
         elif action is fillWindow: self.fitScreen()
@@ -207,10 +494,16 @@ class OverlayPreviewWidget(OverlayWidget):
 
     def drawScreenPreview(self):
 
-        width = self.screen().size().width()
-        height = self.screen().size().height()
-        self.cellSize = Math.toCellSize(width + height)
-        self.screenPreviewItem = ScreenPreviewItem(width, height, self.cellSize)
+        desktop = VirtualDesktop.instance()
+        width = desktop.geometry().width()
+        height = desktop.geometry().height()
+
+        # Keep the existing grid when the desktop changes so item sizes stay snapped
+        if self.screenPreviewItem is None: self.cellSize = Math.toCellSize(width + height)
+        else: self.view.scene().removeItem(self.screenPreviewItem)
+
+        self.screenPreviewItem = ScreenPreviewItem(width, height, self.cellSize, desktop.screenRects())
+        self.screenPreviewItem.setZValue(-1)
         self.view.scene().addItem(self.screenPreviewItem)
 
     def zoomIn(self):
@@ -229,9 +522,15 @@ class OverlayPreviewWidget(OverlayWidget):
             Qt.AspectRatioMode.KeepAspectRatio
         )
 
-    def addItem(self, proxy: OverlayItemProxy = None, position: QPoint = None):
+    def addText(self, position: QPoint):
+
+        template, accepted = QInputDialog.getText(self, 'New Text', TextStore.HELP, text=TextStore.DEFAULT_TEMPLATE)
+        if accepted and template: self.addItem(position=position, source=TextStore.SCHEME + template)
+
+    def addItem(self, proxy: OverlayItemProxy = None, position: QPoint = None, source: str = ''):
 
         preview = OverlayPreviewGraphicsItem(self, 0, 0, self.cellSize * 10, self.cellSize * 10)
+        if source: preview.setSource(source)
 
         if position is not None: 
 
@@ -248,18 +547,211 @@ class OverlayPreviewWidget(OverlayWidget):
         if graphics is not None: 
             
             self.view.scene().removeItem(graphics)
+            graphics.releaseImage()
             self.itemDeleted.emit(graphics)
         
-        elif proxy is not None: self.view.scene().removeItem(proxy.previewGraphicsItem())
+        elif proxy is not None: 
+            
+            self.view.scene().removeItem(proxy.previewGraphicsItem())
+            proxy.previewGraphicsItem().releaseImage()
+
+    def addItems(self, items: List[Tuple[OverlayItemProxy, OverlayItem]]):
+
+        scene = self.view.scene()
+
+        for proxy, model in items:
+
+            preview = OverlayPreviewGraphicsItem(self, 0, 0, model.width, model.height)
+            preview.setRect(model.x, model.y, model.width, model.height)
+            preview.setDeferredSource(model.source)
+            preview.setLayer(model.layer)
+
+            scene.addItem(preview)
+            proxy.setpreviewGraphicsItem(preview)
+
+    def deleteItems(self, proxies: List[OverlayItemProxy]):
+
+        scene = self.view.scene()
+
+        for proxy in proxies:
+
+            graphics = proxy.previewGraphicsItem()
+            if graphics.scene() is scene: scene.removeItem(graphics)
+            graphics.releaseImage()
 
     def updateItem(self, proxy: OverlayItemProxy = None, graphics: OverlayPreviewGraphicsItem = None):
 
         if graphics is not None: self.itemChanged.emit(graphics)
 
-    def selectItem(self, selected: bool, proxy: OverlayItemProxy = None, graphics: OverlayPreviewGraphicsItem = None):
+    def selectedPreviews(self) -> List[OverlayPreviewGraphicsItem]:
+
+        return [item for item in self.view.scene().selectedItems() if isinstance(item, OverlayPreviewGraphicsItem)]
+
+    def setSelection(self, proxies: List[OverlayItemProxy]):
+
+        # Only items whose state actually changes are touched, so a click costs O(selection) not O(items)
+        targets = [proxy.previewGraphicsItem() for proxy in proxies]
+        keep = set(id(item) for item in targets)
+        self.__settingSelection = True
+
+        for item in self.view.scene().selectedItems():
+
+            if isinstance(item, OverlayPreviewGraphicsItem) and id(item) not in keep: item.setSelected(False)
+
+        for item in targets:
+
+            if not item.isSelected(): item.setSelected(True)
+
+        self.__settingSelection = False
+
+    def onSelectionChanged(self):
+
+        if not self.__settingSelection: self.selectionChanged.emit(self.selectedPreviews())
+
+    def groupRect(self, items: List[OverlayPreviewGraphicsItem]) -> QRectF:
+
+        rect = QRectF()
+        for item in items: rect = rect.united(item.sceneBoundingRect())
+
+        return rect
+
+    def clampDelta(self, items: List[OverlayPreviewGraphicsItem], dx: float, dy: float) -> Tuple[float, float]:
+
+        # Keep the whole group on screen without changing its shape
+        rect = self.groupRect(items)
+        dx = Math.clamp(dx, -rect.left(), self.screenPreviewItem.width - rect.right())
+        dy = Math.clamp(dy, -rect.top(), self.screenPreviewItem.height - rect.bottom())
+
+        return dx, dy
+
+    def moveItems(self, items: List[OverlayPreviewGraphicsItem], dx: float, dy: float):
+
+        dx, dy = self.clampDelta(items, dx, dy)
+        if dx == 0 and dy == 0: return
+
+        for item in items: item.moveBy(dx, dy)
+
+    def dragItems(self, anchor: OverlayPreviewGraphicsItem, dx: float, dy: float):
+
+        if not self.__dragging:
+
+            self.__dragging = self.selectedPreviews() if anchor.isSelected() else [anchor]
+            self.__dragOrigins = [item.geometry() for item in self.__dragging]
+            for item in self.__dragging: item.isDragging = True
+
+        self.moveItems(self.__dragging, dx, dy)
+
+    def finishDrag(self, anchor: OverlayPreviewGraphicsItem):
+
+        items = self.__dragging or [anchor]
+        origins = self.__dragOrigins or [anchor.geometry()]
+        self.__dragging = []
+        self.__dragOrigins = []
+
+        for item in items: item.isDragging = False
+
+        # Snap the group by the anchor's offset so relative placement survives
+        snapped = Math.gridSnap(anchor.x(), anchor.y(), self.cellSize)
+        self.moveItems(items, snapped.x() - anchor.x(), snapped.y() - anchor.y())
+
+        for item in items: item.geometryChanged()
+        self.emitGeometryEdited(items, origins, 'Move')
+        self.itemsChanged.emit(items)
+
+    def emitGeometryEdited(self, items: List[OverlayPreviewGraphicsItem], origins: List[Tuple[int, int, int, int]], text: str):
+
+        # One edit per gesture keeps history to a delta per item, however long the drag
+        edits = [(item, origin, item.geometry()) for item, origin in zip(items, origins) if origin != item.geometry()]
+        if edits: self.geometryEdited.emit(edits, text)
+
+    def nudgeSelection(self, dx: int, dy: int):
+
+        items = self.selectedPreviews()
+        if not items: return
+
+        origins = [item.geometry() for item in items]
+        self.moveItems(items, dx, dy)
+        self.emitGeometryEdited(items, origins, 'Nudge')
+        self.itemsChanged.emit(items)
+
+    def alignItems(self, edge: str):
+
+        items = self.selectedPreviews()
+        origins = [item.geometry() for item in items]
+        rect = self.groupRect(items)
+
+        for item in items:
+
+            bounds = item.sceneBoundingRect()
+
+            if   edge == 'left': item.setX(rect.left())
+            elif edge == 'right': item.setX(rect.right() - bounds.width())
+            elif edge == 'top': item.setY(rect.top())
+            elif edge == 'bottom': item.setY(rect.bottom() - bounds.height())
+            elif edge == 'hcenter': item.setX(Math.gridSnapSingle(rect.center().x() - bounds.width() / 2, self.cellSize))
+            elif edge == 'vcenter': item.setY(Math.gridSnapSingle(rect.center().y() - bounds.height() / 2, self.cellSize))
+
+        self.emitGeometryEdited(items, origins, 'Align')
+        self.itemsChanged.emit(items)
+
+    def matchSize(self, width: bool, height: bool):
+
+        items = self.selectedPreviews()
+        origins = [item.geometry() for item in items]
+        largestWidth = max(item.rect().width() for item in items)
+        largestHeight = max(item.rect().height() for item in items)
+
+        for item in items:
+
+            w = largestWidth if width else item.rect().width()
+            h = largestHeight if height else item.rect().height()
+            x = Math.clamp(item.x(), 0, self.screenPreviewItem.width - w)
+            y = Math.clamp(item.y(), 0, self.screenPreviewItem.height - h)
+            item.setRect(x, y, w, h)
+
+        self.emitGeometryEdited(items, origins, 'Match Size')
+        self.itemsChanged.emit(items)
+
+    def addLayerMenu(self, menu: QMenu, anchor: OverlayPreviewGraphicsItem) -> Dict[QAction, Callable]:
+
+        layerMenu = menu.addMenu('Layer')
+        actions: Dict[QAction, Callable] = {}
+
+        for name in LayerRegistry.instance().names():
+
+            action = layerMenu.addAction(name)
+            action.setCheckable(True)
+            action.setChecked(name == anchor.layer())
+            actions[action] = lambda name=name: self.setLayer(anchor, name)
+
+        return actions
 
-        if graphics is not None: self.itemSelected.emit(graphics, selected)
-        elif proxy is not None: proxy.previewGraphicsItem().setSelected(selected)
+    def setLayer(self, anchor: OverlayPreviewGraphicsItem, name: str):
+
+        items = self.selectedPreviews() if anchor.isSelected() else [anchor]
+        edits = [(item, item.layer(), name) for item in items if item.layer() != name]
+
+        for item, _, after in edits: item.setLayer(after)
+        if edits: self.layerEdited.emit(edits)
+
+    def addArrangeMenus(self, menu: QMenu) -> Dict[QAction, Callable]:
+
+        if len(self.selectedPreviews()) < 2: return {}
+
+        menu.addSeparator()
+        alignMenu = menu.addMenu('Align')
+        matchMenu = menu.addMenu('Match Size')
+        actions: Dict[QAction, Callable] = {}
+
+        for text, edge in (('Left', 'left'), ('Right', 'right'), ('Top', 'top'), ('Bottom', 'bottom'), ('Horizontal Centers', 'hcenter'), ('Vertical Centers', 'vcenter')):
+
+            actions[alignMenu.addAction(text)] = lambda edge=edge: self.alignItems(edge)
+
+        actions[matchMenu.addAction('Width')] = lambda: self.matchSize(True, False)
+        actions[matchMenu.addAction('Height')] = lambda: self.matchSize(False, True)
+        actions[matchMenu.addAction('Both')] = lambda: self.matchSize(True, True)
+
+        return actions
 
 class OverlayItemListWidget(OverlayWidget):
 
@@ -271,7 +763,8 @@ class OverlayItemListWidget(OverlayWidget):
         self.label = QLabel('Items')
         self.list = QListWidget()
 
-        self.list.currentItemChanged.connect(self.onCurrentItemChanged)
+        self.list.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.list.itemSelectionChanged.connect(self.onSelectionChanged)
 
         self.layout().addWidget(self.label)
         self.layout().addWidget(self.list)
@@ -298,8 +791,9 @@ class OverlayItemListWidget(OverlayWidget):
 
         action = contextMenu.exec(self.mapToGlobal(e.pos()))
 
+        # With extended selection Delete takes every selected row, undone as one step
         if   action is newImage: self.addItem()
-        elif action is deleteItem: self.deleteItem(widget=self.list.currentItem())
+        elif action is deleteItem: self.itemsDeleted.emit(self.list.selectedItems() or [self.list.currentItem()])
 
     def stylize(self):
 
@@ -327,20 +821,53 @@ class OverlayItemListWidget(OverlayWidget):
         if widget is not None: self.itemDeleted.emit(self.list.takeItem(self.list.row(widget)))
         elif proxy is not None: self.list.takeItem(self.list.row(proxy.listWidgetItem()))
 
+    def addItems(self, items: List[Tuple[OverlayItemProxy, OverlayItem]]):
 
-    def selectItem(self, selected: bool, proxy: OverlayItemProxy = None, widget: OverlayListWidgetItem = None):
+        self.list.blockSignals(True)
+        self.list.setUpdatesEnabled(False)
 
-        if widget is not None: self.itemSelected.emit(widget, selected)
+        for proxy, model in items:
 
-        elif proxy is not None: 
-            
-            if selected: self.list.setCurrentItem(proxy.listWidgetItem())
-            else: self.list.setCurrentItem(None)
+            widget = OverlayListWidgetItem(self, model.name)
+            self.list.addItem(widget)
+            proxy.setListWidgetItem(widget)
+
+        self.list.setUpdatesEnabled(True)
+        self.list.blockSignals(False)
+
+    def deleteItems(self, proxies: List[OverlayItemProxy]):
 
-    def onCurrentItemChanged(self, current: OverlayListWidgetItem, previous: OverlayListWidgetItem):
+        self.list.blockSignals(True)
 
-        if previous is not None: self.selectItem(False, widget=previous)
-        if current is not None: self.selectItem(True, widget=current)
+        if len(proxies) == self.list.count(): self.list.clear()
+        else:
+
+            targets = set(id(proxy.listWidgetItem()) for proxy in proxies)
+            rows = [row for row in range(self.list.count()) if id(self.list.item(row)) in targets]
+            for row in reversed(rows): self.list.takeItem(row)
+
+        self.list.blockSignals(False)
+
+    def setSelection(self, proxies: List[OverlayItemProxy]):
+
+        targets = [proxy.listWidgetItem() for proxy in proxies]
+        keep = set(id(item) for item in targets)
+        self.list.blockSignals(True)
+
+        for item in self.list.selectedItems():
+
+            if id(item) not in keep: item.setSelected(False)
+
+        for item in targets:
+
+            if not item.isSelected(): item.setSelected(True)
+
+        if len(proxies) == 1: self.list.setCurrentItem(proxies[0].listWidgetItem(), QItemSelectionModel.SelectionFlag.NoUpdate)
+        self.list.blockSignals(False)
+
+    def onSelectionChanged(self):
+
+        self.selectionChanged.emit(self.list.selectedItems())
 
 class OverlayItemPropertiesWidget(OverlayWidget):
 
@@ -371,8 +898,15 @@ class OverlayItemPropertiesWidget(OverlayWidget):
         self.layout().addWidget(QLabel('Source:'), 3, 0, 1, 1)
         self.layout().addWidget(self.srcEdit,      3, 1, 1, 3)
         self.layout().setRowStretch(4, 1)
+        self.__shown: Dict[str, str] = {}
+        self.__refreshTimer = QTimer(self)
+        self.__refreshTimer.setSingleShot(True)
+        self.__refreshTimer.setInterval(0)
+        self.__refreshTimer.timeout.connect(self.refresh)
+
         self.stylize()
-        self.setItem()
+        self.connectLineEdits()
+        self.enableLineEdits(False)
 
     def openFileBrowser(self, _):
 
@@ -391,33 +925,13 @@ class OverlayItemPropertiesWidget(OverlayWidget):
         self.label.setStyleSheet(Style.OverlayItemBoxTitle)
         self.label.setContentsMargins(Style.SmallMargins)
 
-    def clearLineEdits(self):
+    def lineEdits(self) -> Dict[str, QLineEdit]:
 
-        self.xEdit.setText('')
-        self.yEdit.setText('')
-        self.wEdit.setText('')
-        self.hEdit.setText('')
-        self.srcEdit.setText('')
+        return {'x': self.xEdit, 'y': self.yEdit, 'w': self.wEdit, 'h': self.hEdit, 'source': self.srcEdit}
 
     def enableLineEdits(self, enable: bool):
 
-        self.xEdit.setEnabled(enable)
-        self.yEdit.setEnabled(enable)
-        self.wEdit.setEnabled(enable)
-        self.hEdit.setEnabled(enable)
-        self.srcEdit.setEnabled(enable)
-
-    def disconnectLineEdits(self):
-
-        try:
-
-            self.xEdit.editingFinished.disconnect()
-            self.yEdit.editingFinished.disconnect()
-            self.wEdit.editingFinished.disconnect()
-            self.hEdit.editingFinished.disconnect()
-            self.srcEdit.clicked.disconnect()
-        
-        except: pass
+        for edit in self.lineEdits().values(): edit.setEnabled(enable)
 
     def connectLineEdits(self):
 
@@ -427,50 +941,82 @@ class OverlayItemPropertiesWidget(OverlayWidget):
         self.hEdit.editingFinished.connect(self.updateItemGraphics)
         self.srcEdit.clicked.connect(self.updateItemSource)
 
-    def linkLineEdits(self):
+    def values(self) -> Dict[str, str]:
+
+        if self.proxy is None: return dict.fromkeys(self.lineEdits(), '')
 
-        self.xEdit.setText(str(self.proxy.x()))
-        self.yEdit.setText(str(self.proxy.y()))
-        self.wEdit.setText(str(self.proxy.width()))
-        self.hEdit.setText(str(self.proxy.height()))
-        self.srcEdit.setText(self.proxy.source())
+        x, y, w, h = self.proxy.geometry()
+        return {'x': str(x), 'y': str(y), 'w': str(w), 'h': str(h), 'source': self.proxy.source()}
 
     def setItem(self, proxy: OverlayItemProxy = None):
 
+        if proxy is self.proxy:
+
+            self.scheduleRefresh()
+            return
+
+        if self.proxy is not None: self.proxy.previewGraphicsItem().unsubscribe(id(self))
         self.proxy = proxy 
-        if proxy is None: 
-            
-            self.disconnectLineEdits()
-            self.clearLineEdits()
-            self.enableLineEdits(False)
-            return 
+        self.__shown.clear()
 
-        self.disconnectLineEdits()
-        self.linkLineEdits()
-        self.connectLineEdits()
-        self.enableLineEdits(True)
+        if proxy is not None: proxy.previewGraphicsItem().subscribe(id(self), self.scheduleRefresh)
+        self.enableLineEdits(proxy is not None)
+        self.refresh()
+
+    def scheduleRefresh(self):
+
+        # Drags notify on every move; the panel catches up once per event-loop turn
+        if not self.__refreshTimer.isActive(): self.__refreshTimer.start()
+
+    def refresh(self):
+
+        self.__refreshTimer.stop()
+        edits = self.lineEdits()
+
+        for field, value in self.values().items():
+
+            edit = edits[field]
+            if self.__shown.get(field) == value or edit.isModified(): continue
+
+            edit.setText(value)
+            self.__shown[field] = value
 
     def updateItemGraphics(self):
 
         if self.proxy is None: return
 
-        self.proxy.setRect(
+        try: values = [float(edit.text()) for edit in (self.xEdit, self.yEdit, self.wEdit, self.hEdit)]
+        except ValueError: values = None
 
-            float(self.xEdit.text()),
-            float(self.yEdit.text()),
-            float(self.wEdit.text()),
-            float(self.hEdit.text())
-        )
+        for edit in self.lineEdits().values(): edit.setModified(False)
+        self.__shown.clear()
+
+        if values is None:
 
-        # Quick and dirty way to format fields
-        self.setItem(self.proxy)
+            self.refresh()
+            return
+
+        before = self.proxy.geometry()
+        self.proxy.setRect(*values)
+
+        if self.proxy.geometry() != before: self.geometryEdited.emit([(self.proxy, before, self.proxy.geometry())], 'Edit Geometry')
+        self.refresh()
 
     def updateItemSource(self, event: QEvent):
 
         if event is self.currentEvent: return 
         self.currentEvent = event
 
-        fname, _ = QFileDialog.getOpenFileName(filter='All Images (*.jpg *.jpeg *.png *.gif)')
+        before = self.proxy.source()
+
+        if TextStore.isText(before):
+
+            template, accepted = QInputDialog.getText(self, 'Edit Text', TextStore.HELP, text=before[len(TextStore.SCHEME):])
+            fname = TextStore.SCHEME + template if accepted and template else before
+
+        else: fname, _ = QFileDialog.getOpenFileName(filter='All Images (*.jpg *.jpeg *.png *.gif)')
+
         self.srcEdit.setText(fname)
         self.proxy.setSource(fname)
+        if fname != before: self.sourceEdited.emit(self.proxy, before, fname)
 
@@ -1,15 +1,42 @@
-import sys
-from typing import List
-from Dialogs import HotkeyMapperDialog
+import time
+STARTED = time.perf_counter()
 
-from Globals import Style
+import argparse
+import math
+import os
+import sys
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List
+from AssetPack import AssetPack
+from ControlClient import defaultSocketPath
+
+from Globals import Math, Style
+from History import GeometryCommand, ItemsCommand, LayerCommand, SourceCommand, UndoStack
+from Images import ImageStore
+from Importing import ImageImporter, importableFiles
+from Layers import LayerRegistry
+from Layouts import LayoutError, LayoutFile
 from Items import OverlayPreviewGraphicsItem, OverlayListWidgetItem
-from Models import OverlayItemProxy
-from Widgets import EGraphicsView, OverlayItemListWidget, OverlayItemPropertiesWidget, OverlayPreviewWidget
+from Models import OverlayItem, OverlayItemProxy, OverlayItemRegistry
+from Profiling import StartupProfiler
+from Scheduling import OverlayUpdateScheduler
+from Screens import VirtualDesktop
+from Widgets import EGraphicsView, FrameTimingHud, OverlayGraphicsView, OverlayItemListWidget, OverlayItemPropertiesWidget, OverlayPreviewWidget
+
+from PySide6.QtCore import QObject, QPoint, QRectF, QSettings, QSize, Qt, QTimer, Signal, Slot
+from PySide6.QtWidgets import QApplication, QFileDialog, QGraphicsRectItem, QGraphicsScene, QGraphicsView, QHBoxLayout, QLayout, QMainWindow, QMessageBox, QProgressDialog, QSplitter, QWidget
+from PySide6.QtGui import QAction, QActionGroup, QCloseEvent, QKeyEvent, QKeySequence, QResizeEvent, QScreen, QShortcut, QShowEvent
+
+def environmentNumber(name: str, default: float = 0) -> float:
 
-from PySide6.QtCore import Qt, Slot
-from PySide6.QtWidgets import QApplication, QGraphicsRectItem, QHBoxLayout, QLayout, QMainWindow, QSplitter, QWidget
-from PySide6.QtGui import QAction, QCloseEvent, QKeyEvent, QResizeEvent
+    # A typo in a tuning variable falls back to the default instead of stopping startup
+    try: value = float(os.environ.get(name, default))
+    except ValueError:
+
+        print('Ignoring {}={!r}: not a number'.format(name, os.environ.get(name)), file=sys.stderr)
+        return default
+
+    return value if math.isfinite(value) and value >= 0 else default
 
 class EWindow(QMainWindow):
 
@@ -25,7 +52,10 @@ class EWindow(QMainWindow):
 
 class ElayvateOverlayWindow(EWindow):
 
-    def __init__(self):
+    # Signals
+    editorRequested = Signal()
+
+    def __init__(self, screen: QScreen, scene: QGraphicsScene):
 
         super().__init__()
         
@@ -34,17 +64,27 @@ class ElayvateOverlayWindow(EWindow):
         self.setAttribute(Qt.WA_TransparentForMouseEvents, True)
         self.setAttribute(Qt.WA_AlwaysStackOnTop, True)
 
-        self.view = EGraphicsView(self.centralWidget())
+        self.view = OverlayGraphicsView(self.centralWidget(), scene)
         
         self.view.setStyleSheet('background: transparent')
-        self.view.setFixedSize(self.screen().size())
+        self.view.setAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop)
+        self.view.setViewportUpdateMode(QGraphicsView.MinimalViewportUpdate)
+        self.view.setOptimizationFlags(QGraphicsView.DontSavePainterState | QGraphicsView.DontAdjustForAntialiasing)
+        self.view.setDebugDamage(os.environ.get('ELAYVATE_DEBUG_DAMAGE') == '1')
 
         self.innerLayout().setContentsMargins(0, 0, 0, 0)
         self.innerLayout().addWidget(self.view)
+        self.hud = FrameTimingHud(self.centralWidget(), self.view)
+        self.setOverlayScreen(screen)
 
-    def addItem(self, proxy: OverlayItemProxy):
+    def setOverlayScreen(self, screen: QScreen):
 
-        self.view.scene().addItem(proxy.finalGraphicsItem())
+        # The view frames only this screen's part of the shared scene
+        self.overlayScreen = screen
+        self.setScreen(screen)
+        self.setGeometry(screen.geometry())
+        self.view.setFixedSize(screen.size())
+        self.view.setSceneRect(QRectF(VirtualDesktop.instance().screenRect(screen)))
 
     def keyPressEvent(self, event: QKeyEvent):
         
@@ -52,19 +92,145 @@ class ElayvateOverlayWindow(EWindow):
             
             self.view.setVisible(not self.view.isVisible())
 
+        elif event.modifiers() == Qt.ControlModifier and event.key() == Qt.Key_E:
+
+            self.editorRequested.emit()
+
+        elif event.modifiers() == Qt.ControlModifier and event.key() == Qt.Key_H:
+
+            self.hud.setActive(not self.hud.isActive())
+
+        elif event.modifiers() == Qt.ControlModifier | Qt.ShiftModifier and event.key() == Qt.Key_D:
+
+            self.view.setDebugDamage(not self.view.debugDamage)
+
+class ElayvateOverlay(QObject):
+
+    # Signals
+    editorRequested = Signal()
+
+    def __init__(self):
+
+        super().__init__()
+        self.scene = QGraphicsScene(self)
+        self.isShown = False
+        self.__windows: Dict[QScreen, ElayvateOverlayWindow] = {}
+        self.__layerShortcuts: List[QShortcut] = []
+
+        self.syncScreens()
+        VirtualDesktop.instance().changed.connect(self.syncScreens)
+        LayerRegistry.instance().changed.connect(self.updateLayerShortcuts)
+        self.updateLayerShortcuts()
+
+    def windows(self) -> List[ElayvateOverlayWindow]:
+
+        return list(self.__windows.values())
+
+    def syncScreens(self):
+
+        desktop = VirtualDesktop.instance()
+        screens = desktop.screens()
+        self.scene.setSceneRect(QRectF(0, 0, desktop.geometry().width(), desktop.geometry().height()))
+
+        for screen in [screen for screen in self.__windows if screen not in screens]:
+
+            window = self.__windows.pop(screen)
+            window.hud.setActive(False)
+            window.close()
+            window.deleteLater()
+
+        for screen in screens:
+
+            window = self.__windows.get(screen)
+
+            if window is None:
+
+                window = ElayvateOverlayWindow(screen, self.scene)
+                window.editorRequested.connect(self.editorRequested)
+                self.__windows[screen] = window
+                if self.isShown: window.showFullScreen()
+
+            else: window.setOverlayScreen(screen)
+
+    def updateLayerShortcuts(self):
+
+        for shortcut in self.__layerShortcuts: shortcut.deleteLater()
+        self.__layerShortcuts = []
+
+        # A click-through overlay never has focus, so layer hotkeys work from any Elayvate window;
+        # Qt cannot see keys while another application (e.g. the game) is focused
+        for layer in LayerRegistry.instance().layers():
+
+            if not layer.hotkey: continue
+
+            shortcut = QShortcut(layer.shortcut(), self)
+            shortcut.setContext(Qt.ShortcutContext.ApplicationShortcut)
+            shortcut.activated.connect(lambda name=layer.name: LayerRegistry.instance().toggle(name))
+            self.__layerShortcuts.append(shortcut)
+
+    def showFullScreen(self):
+
+        self.isShown = True
+        for window in self.__windows.values(): window.showFullScreen()
+
+    def close(self):
+
+        self.isShown = False
+        for window in self.__windows.values(): window.close()
+
+    def addItem(self, proxy: OverlayItemProxy):
+
+        self.scene.addItem(proxy.finalGraphicsItem())
+
+    def addItems(self, proxies: List[OverlayItemProxy]):
+
+        for proxy in proxies: self.scene.addItem(proxy.finalGraphicsItem())
+
+    def deleteItems(self, proxies: List[OverlayItemProxy]):
+
+        for proxy in proxies: 
+            
+            if proxy.finalGraphicsItem().scene() is not None: self.scene.removeItem(proxy.finalGraphicsItem())
+
+    @contextmanager
+    def bulkUpdate(self):
+
+        views = [window.view for window in self.__windows.values()]
+        for view in views: view.setUpdatesEnabled(False)
+        self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+
+        try: yield
+
+        finally:
+
+            self.scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+
+            for view in views:
+
+                view.setUpdatesEnabled(True)
+                view.viewport().update()
+
 class ElayvateWindow(EWindow):
-    
-    proxies: List[OverlayItemProxy] = []
 
-    def __init__(self, overlay: ElayvateOverlayWindow):
+    # Signals
+    layoutChanged = Signal(str)
+
+    def __init__(self, overlay: ElayvateOverlay):
         
         super().__init__()
-        self.overlayWindow = overlay
+        self.proxies = OverlayItemRegistry()
+        self.history = UndoStack(self, int(environmentNumber('ELAYVATE_UNDO_LIMIT_KB')) * 1024 or UndoStack.DEFAULT_LIMIT)
+        self.layoutPath = None
+        self.itemProps = None
+        self.importer = None
+        self.importProgress = None
+        self.importUpdate = None
+        self.importedModels: List[OverlayItem] = []
+        self.overlay = overlay
         self.hSplitter = QSplitter(Qt.Orientation.Horizontal)
         self.vSplitter = QSplitter(Qt.Orientation.Vertical)
 
-        self.setWindowTitle('Elayvate')
-        self.createMenuBar()
+        self.updateWindowTitle()
         self.createItemsBox()
         self.createOverlayBox()
 
@@ -80,9 +246,23 @@ class ElayvateWindow(EWindow):
         )
         self.setMinimumSize(300, 100)
 
+    def ensureEditorUi(self):
+
+        if self.itemProps is not None: return
+
+        self.createMenuBar()
+        self.createPropertiesBox()
+
+    def showEvent(self, event: QShowEvent):
+
+        self.ensureEditorUi()
+        super().showEvent(event)
+
     def createMenuBar(self):
         
         self.createFileMenu()
+        self.createEditMenu()
+        self.createLayersMenu()
         self.createSettingsMenu()
         self.createHelpMenu()
 
@@ -92,13 +272,26 @@ class ElayvateWindow(EWindow):
         openAction = QAction('&Open...', self)
         saveAction = QAction('&Save', self)
         saveAsAction = QAction('&Save As...', self)
+        importAction = QAction('&Import Images...', self)
+        importFolderAction = QAction('Import &Folder...', self)
         exitAction = QAction('&Exit', self)
 
         menuBar = self.menuBar()
         fileMenu = menuBar.addMenu('&File')
 
+        newAction.setShortcut('Ctrl+N')
+        openAction.setShortcut('Ctrl+O')
         saveAction.setShortcut('Ctrl+S')
+        saveAsAction.setShortcut('Ctrl+Shift+S')
+        importAction.setShortcut('Ctrl+I')
         exitAction.setShortcut('Alt+F4')
+
+        newAction.triggered.connect(self.newLayout)
+        openAction.triggered.connect(self.openLayout)
+        saveAction.triggered.connect(self.saveLayout)
+        saveAsAction.triggered.connect(self.saveLayoutAs)
+        importAction.triggered.connect(self.importFiles)
+        importFolderAction.triggered.connect(self.importFolder)
         exitAction.triggered.connect(self.close)
 
         fileMenu.addAction(newAction)
@@ -107,8 +300,254 @@ class ElayvateWindow(EWindow):
         fileMenu.addAction(saveAction)
         fileMenu.addAction(saveAsAction)
         fileMenu.addSeparator()
+        fileMenu.addAction(importAction)
+        fileMenu.addAction(importFolderAction)
+        fileMenu.addSeparator()
         fileMenu.addAction(exitAction)
 
+    def updateWindowTitle(self):
+
+        if self.layoutPath is None: self.setWindowTitle('Elayvate')
+        else: self.setWindowTitle('Elayvate - {}'.format(os.path.basename(self.layoutPath)))
+
+    def newLayout(self):
+
+        self.clearLayout(record=False)
+        self.history.clear()
+        LayerRegistry.instance().reset()
+        self.layoutPath = None
+        self.updateWindowTitle()
+
+    def openLayout(self):
+
+        path, _ = QFileDialog.getOpenFileName(self, 'Open Layout', filter=LayoutFile.FILTER)
+        if path == '': return
+
+        try: self.loadLayout(path)
+        except (OSError, LayoutError) as e: QMessageBox.warning(self, 'Open Layout', str(e))
+
+    def saveLayout(self):
+
+        if self.layoutPath is None: 
+            
+            self.saveLayoutAs()
+            return
+
+        try: LayoutFile(self.layoutPath).write((proxy.model() for proxy in self.proxies), LayerRegistry.instance().toList())
+        except OSError as e: QMessageBox.warning(self, 'Save Layout', str(e))
+
+    def saveLayoutAs(self):
+
+        path, _ = QFileDialog.getSaveFileName(self, 'Save Layout As', filter=LayoutFile.FILTER)
+        if path == '': return
+        if not path.endswith(LayoutFile.EXTENSION): path += LayoutFile.EXTENSION
+
+        self.layoutPath = path
+        self.updateWindowTitle()
+        self.saveLayout()
+        self.layoutChanged.emit(path)
+
+    def loadLayout(self, path: str):
+
+        # Parse and validate the whole file before the current layout is touched
+        layout = LayoutFile(path)
+        layers = layout.layers()
+        models = list(layout.read())
+        pack = AssetPack.forLayout(path)
+        ids = set()
+
+        self.clearLayout(record=False)
+        self.history.clear()
+        if pack is not None: ImageStore.instance().addPack(pack)
+
+        # Layers come first so items are stacked by the layout's own z-order
+        if layers is not None: LayerRegistry.instance().load(layers)
+        else: LayerRegistry.instance().reset()
+
+        with self.overlayFrame.view.bulkUpdate(), self.overlay.bulkUpdate():
+
+            for start in range(0, len(models), LayoutFile.BATCH_SIZE):
+
+                batch = models[start:start + LayoutFile.BATCH_SIZE]
+                items = [(self.newProxy(model, ids), model) for model in batch]
+                proxies = [proxy for proxy, _ in items]
+
+                self.overlayFrame.addItems(items)
+                self.itemList.addItems(items)
+                self.overlay.addItems(proxies)
+                for proxy in proxies: self.proxies.add(proxy)
+
+        self.layoutPath = path
+        self.updateWindowTitle()
+        self.layoutChanged.emit(path)
+
+    def insertItems(self, models: List[OverlayItem]) -> List[OverlayItemProxy]:
+
+        ids = set()
+        items = [(self.newProxy(model, ids), model) for model in models]
+        proxies = [proxy for proxy, _ in items]
+
+        self.overlayFrame.addItems(items)
+        self.itemList.addItems(items)
+        self.overlay.addItems(proxies)
+        for proxy in proxies: self.proxies.add(proxy)
+
+        return proxies
+
+    def importFiles(self):
+
+        paths, _ = QFileDialog.getOpenFileNames(self, 'Import Images', filter='All Images (*.jpg *.jpeg *.png *.gif *.bmp *.webp)')
+        if paths: self.importPaths(paths)
+
+    def importFolder(self):
+
+        path = QFileDialog.getExistingDirectory(self, 'Import Folder')
+        if path != '': self.importPaths([path])
+
+    def importPaths(self, paths: List[str], origin: QPoint = None):
+
+        if self.importer is not None: return
+
+        files = importableFiles(paths)
+        if not files: return
+
+        frame = self.overlayFrame
+        bounds = QSize(frame.screenPreviewItem.width, frame.screenPreviewItem.height)
+        origin = Math.gridSnap(origin.x(), origin.y(), frame.cellSize) if origin is not None else QPoint(0, 0)
+
+        self.importer = ImageImporter(files, origin, frame.cellSize, bounds)
+        self.importer.batchReady.connect(self.onImportBatch)
+        self.importer.finished.connect(self.onImportFinished)
+
+        self.importProgress = QProgressDialog('Importing {} images...'.format(len(files)), 'Cancel', 0, len(files), self)
+        self.importProgress.setWindowTitle('Import')
+        self.importProgress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.importProgress.setMinimumDuration(250)
+        self.importProgress.canceled.connect(self.importer.cancel)
+        self.importer.progress.connect(self.importProgress.setValue)
+
+        # The scene index is rebuilt once when the import ends, not after every batch
+        self.importUpdate = ExitStack()
+        self.importUpdate.enter_context(self.overlayFrame.view.bulkUpdate())
+        self.importUpdate.enter_context(self.overlay.bulkUpdate())
+
+        self.importer.start()
+
+    def onImportBatch(self, models: List[OverlayItem]):
+
+        proxies = self.insertItems(models)
+        for model, proxy in zip(models, proxies): model.id = proxy.id()
+        self.importedModels.extend(models)
+
+    def onImportFinished(self):
+
+        if self.importer is None: return
+
+        self.importUpdate.close()
+
+        # The whole import undoes as one step
+        if self.importedModels: self.history.push(ItemsCommand('Import', self.importedModels, added=True))
+
+        self.importProgress.reset()
+        self.importProgress.deleteLater()
+        self.importer.deleteLater()
+        self.importer = None
+        self.importProgress = None
+        self.importUpdate = None
+        self.importedModels = []
+
+    def newProxy(self, model: OverlayItem, ids: set) -> OverlayItemProxy:
+
+        proxy = OverlayItemProxy() if model.id <= 0 or model.id in ids else OverlayItemProxy(model.id)
+        ids.add(proxy.id())
+        return proxy
+
+    def createEditMenu(self):
+
+        self.undoAction = QAction('&Undo', self)
+        self.redoAction = QAction('&Redo', self)
+        deleteAction = QAction('&Delete', self)
+        clearAction = QAction('&Clear Layout', self)
+
+        menuBar = self.menuBar()
+        editMenu = menuBar.addMenu('&Edit')
+
+        self.undoAction.setShortcut('Ctrl+Z')
+        self.redoAction.setShortcuts(['Ctrl+Y', 'Ctrl+Shift+Z'])
+        deleteAction.setShortcut('Delete')
+        self.undoAction.triggered.connect(self.undo)
+        self.redoAction.triggered.connect(self.redo)
+        deleteAction.triggered.connect(self.deleteSelection)
+        clearAction.triggered.connect(lambda: self.clearLayout())
+        self.history.changed.connect(self.updateHistoryActions)
+        self.updateHistoryActions()
+
+        editMenu.addAction(self.undoAction)
+        editMenu.addAction(self.redoAction)
+        editMenu.addSeparator()
+        editMenu.addAction(deleteAction)
+        editMenu.addSeparator()
+        editMenu.addAction(clearAction)
+
+    def updateHistoryActions(self):
+
+        undoText, redoText = self.history.undoText(), self.history.redoText()
+
+        self.undoAction.setEnabled(undoText is not None)
+        self.redoAction.setEnabled(redoText is not None)
+        self.undoAction.setText('&Undo' if undoText is None else '&Undo {}'.format(undoText))
+        self.redoAction.setText('&Redo' if redoText is None else '&Redo {}'.format(redoText))
+
+    def undo(self):
+
+        self.history.undo()
+        self.refreshProperties()
+
+    def redo(self):
+
+        self.history.redo()
+        self.refreshProperties()
+
+    def refreshProperties(self):
+
+        if self.itemProps is None: return
+
+        proxy = self.itemProps.proxy
+        self.showProperties(proxy if proxy is not None and proxy in self.proxies else None)
+
+    def createLayersMenu(self):
+
+        self.layersMenu = self.menuBar().addMenu('&Layers')
+        self.layerActions: Dict[str, QAction] = {}
+
+        layers = LayerRegistry.instance()
+        layers.changed.connect(self.updateLayersMenu)
+        layers.visibilityChanged.connect(self.updateLayerAction)
+        self.updateLayersMenu()
+
+    def updateLayersMenu(self):
+
+        self.layersMenu.clear()
+        self.layerActions.clear()
+
+        # Highest layer first, the way it stacks on screen
+        for layer in reversed(LayerRegistry.instance().layers()):
+
+            # The overlay owns the application-wide hotkey, so the menu only shows it
+            text = layer.name if not layer.hotkey else '{}\t{}'.format(layer.name, layer.shortcut().toString(QKeySequence.SequenceFormat.NativeText))
+            action = QAction(text, self)
+            action.setCheckable(True)
+            action.setChecked(layer.visible)
+            action.toggled.connect(lambda visible, name=layer.name: LayerRegistry.instance().setVisible(name, visible))
+
+            self.layersMenu.addAction(action)
+            self.layerActions[layer.name] = action
+
+    def updateLayerAction(self, name: str):
+
+        action = self.layerActions.get(name)
+        if action is not None: action.setChecked(LayerRegistry.instance().isVisible(name))
+
     def createSettingsMenu(self):
         
         preferencesAction = QAction('&Preferences...', self)
@@ -124,6 +563,8 @@ class ElayvateWindow(EWindow):
 
     def openHotkeyDialog(self):
 
+        from Dialogs import HotkeyMapperDialog
+
         dialog = HotkeyMapperDialog(self)
         dialog.show()
 
@@ -142,16 +583,26 @@ class ElayvateWindow(EWindow):
     def createItemsBox(self):
         
         self.itemList = OverlayItemListWidget(self.centralWidget())
-        self.itemProps = OverlayItemPropertiesWidget(self.centralWidget())
 
         self.itemList.itemAdded.connect(self.onListItemAdded)
         self.itemList.itemDeleted.connect(self.onListItemDeleted)
-        self.itemList.itemSelected.connect(self.onListItemSelected)
+        self.itemList.itemsDeleted.connect(self.onListItemsDeleted)
+        self.itemList.selectionChanged.connect(self.onListSelectionChanged)
 
         self.vSplitter.addWidget(self.itemList)
-        self.vSplitter.addWidget(self.itemProps)
         self.hSplitter.addWidget(self.vSplitter)
 
+    def createPropertiesBox(self):
+
+        self.itemProps = OverlayItemPropertiesWidget(self.centralWidget())
+        self.itemProps.geometryEdited.connect(self.onGeometryEdited)
+        self.itemProps.sourceEdited.connect(self.onSourceEdited)
+        self.vSplitter.addWidget(self.itemProps)
+
+    def showProperties(self, proxy: OverlayItemProxy = None):
+
+        if self.itemProps is not None: self.itemProps.setItem(proxy=proxy)
+
     def createOverlayBox(self):
 
         self.overlayFrame = OverlayPreviewWidget(self.centralWidget())
@@ -159,18 +610,38 @@ class ElayvateWindow(EWindow):
         self.overlayFrame.itemAdded.connect(self.onPreviewItemAdded)
         self.overlayFrame.itemDeleted.connect(self.onPreviewItemDeleted)
         self.overlayFrame.itemChanged.connect(self.onPreviewItemChanged)
-        self.overlayFrame.itemSelected.connect(self.onPreviewItemSelected)
+        self.overlayFrame.itemsChanged.connect(self.onPreviewItemsChanged)
+        self.overlayFrame.selectionChanged.connect(self.onPreviewSelectionChanged)
+        self.overlayFrame.geometryEdited.connect(self.onGeometryEdited)
+        self.overlayFrame.layerEdited.connect(self.onLayerEdited)
+        self.overlayFrame.filesDropped.connect(self.importPaths)
 
         self.hSplitter.addWidget(self.overlayFrame)
 
-    def getProxy(self, object):
+    def getProxy(self, object) -> OverlayItemProxy:
+
+        return self.proxies.get(object)
+
+    def deleteItems(self, proxies: List[OverlayItemProxy], record: bool = True):
+
+        if not proxies: return
+        if record: self.history.push(ItemsCommand('Delete', [proxy.model() for proxy in proxies], added=False))
+        if self.itemProps is not None and self.itemProps.proxy in proxies: self.showProperties(None)
+
+        self.overlayFrame.deleteItems(proxies)
+        self.itemList.deleteItems(proxies)
+        self.overlay.deleteItems(proxies)
+        self.proxies.removeMany(proxies)
+
+    def deleteSelection(self):
 
-        for i, proxy in enumerate(self.proxies):
+        selected = (self.getProxy(item) for item in self.overlayFrame.view.scene().selectedItems())
+        self.deleteItems([proxy for proxy in selected if proxy is not None])
 
-            if proxy.listWidgetItem() is object \
-                or proxy.previewGraphicsItem() is object: return i, proxy
+    def clearLayout(self, *, record: bool = True):
 
-        return -1, None
+        self.deleteItems(list(self.proxies), record)
+        ImageStore.instance().clearPacks()
 
     @Slot(OverlayPreviewGraphicsItem)
     def onPreviewItemAdded(self, object: OverlayPreviewGraphicsItem):
@@ -179,8 +650,9 @@ class ElayvateWindow(EWindow):
         proxy.setpreviewGraphicsItem(object)
 
         self.itemList.addItem(proxy=proxy)
-        self.overlayWindow.addItem(proxy=proxy)
-        self.proxies.append(proxy)
+        self.overlay.addItem(proxy=proxy)
+        self.proxies.add(proxy)
+        self.history.push(ItemsCommand('Add', [proxy.model()], added=True))
 
     @Slot(OverlayListWidgetItem)
     def onListItemAdded(self, object: OverlayListWidgetItem):
@@ -189,81 +661,221 @@ class ElayvateWindow(EWindow):
         proxy.setListWidgetItem(object) 
 
         self.overlayFrame.addItem(proxy=proxy)
-        self.overlayWindow.addItem(proxy=proxy)
-        self.proxies.append(proxy)
+        self.overlay.addItem(proxy=proxy)
+        self.proxies.add(proxy)
+        self.history.push(ItemsCommand('Add', [proxy.model()], added=True))
 
     @Slot(OverlayPreviewGraphicsItem)
     def onPreviewItemDeleted(self, object: OverlayPreviewGraphicsItem):
 
-        _, proxy = self.getProxy(object)
+        proxy = self.getProxy(object)
         if proxy is None: return 
         
+        self.history.push(ItemsCommand('Delete', [proxy.model()], added=False))
         self.itemList.deleteItem(proxy=proxy)
+        self.overlay.deleteItems([proxy])
         self.proxies.remove(proxy)
 
     @Slot(OverlayListWidgetItem)
     def onListItemDeleted(self, object: OverlayListWidgetItem):
 
-        _, proxy = self.getProxy(object)
+        proxy = self.getProxy(object)
         if proxy is None: return 
         
+        self.history.push(ItemsCommand('Delete', [proxy.model()], added=False))
         self.overlayFrame.deleteItem(proxy=proxy)
+        self.overlay.deleteItems([proxy])
         self.proxies.remove(proxy)
 
+    @Slot(object)
+    def onListItemsDeleted(self, objects: List[OverlayListWidgetItem]):
+
+        self.deleteItems([proxy for proxy in map(self.getProxy, objects) if proxy is not None])
+
     @Slot(OverlayPreviewGraphicsItem)
     def onPreviewItemChanged(self, object: OverlayPreviewGraphicsItem):
 
-        i, proxy = self.getProxy(object)
+        proxy = self.getProxy(object)
         if proxy is None: return 
         
-        self.itemProps.setItem(proxy=proxy)
-        self.proxies[i] = proxy
+        self.showProperties(proxy)
 
     @Slot(OverlayListWidgetItem)
     def onListItemChanged(self, object: OverlayListWidgetItem):
 
-        i, proxy = self.getProxy(object)
+        proxy = self.getProxy(object)
         if proxy is None: return 
         
-        self.itemProps.setItem(proxy=proxy)
-        self.proxies[i] = proxy
+        self.showProperties(proxy)
 
-    @Slot(OverlayPreviewGraphicsItem, bool)
-    def onPreviewItemSelected(self, object: OverlayPreviewGraphicsItem, selected: bool):
+    @Slot(object, str)
+    def onGeometryEdited(self, edits: list, text: str):
 
-        i, proxy = self.getProxy(object)
-        if proxy is None: return 
+        deltas = {}
 
-        if selected: self.itemProps.setItem(proxy=proxy)
-        else: self.itemProps.setItem(proxy=None)
+        for object, before, after in edits:
 
-        self.itemList.selectItem(selected, proxy=proxy)
-        self.proxies[i] = proxy 
+            proxy = object if isinstance(object, OverlayItemProxy) else self.getProxy(object)
+            if proxy is not None: deltas[proxy.id()] = (before, after)
 
-    @Slot(OverlayListWidgetItem, bool)
-    def onListItemSelected(self, object: OverlayListWidgetItem, selected: bool):
+        if deltas: self.history.push(GeometryCommand(text, deltas))
 
-        i, proxy = self.getProxy(object)
-        if proxy is None: return 
-        
-        if selected: self.itemProps.setItem(proxy=proxy)
-        else: self.itemProps.setItem(proxy=None)
+    @Slot(object)
+    def onLayerEdited(self, edits: list):
+
+        deltas = {}
+
+        for object, before, after in edits:
+
+            proxy = self.getProxy(object)
+            if proxy is not None: deltas[proxy.id()] = (before, after)
+
+        if deltas: self.history.push(LayerCommand(deltas))
+
+    @Slot(object, str, str)
+    def onSourceEdited(self, proxy: OverlayItemProxy, before: str, after: str):
+
+        self.history.push(SourceCommand(proxy.id(), before, after))
+
+    @Slot(object)
+    def onPreviewItemsChanged(self, objects: List[OverlayPreviewGraphicsItem]):
+
+        if len(objects) == 1: self.onPreviewItemChanged(objects[0])
 
-        self.overlayFrame.selectItem(selected, proxy=proxy)
-        self.proxies[i] = proxy
+    @Slot(object)
+    def onPreviewSelectionChanged(self, objects: List[OverlayPreviewGraphicsItem]):
+
+        proxies = [proxy for proxy in map(self.getProxy, objects) if proxy is not None]
+
+        self.showProperties(proxies[0] if len(proxies) == 1 else None)
+        self.itemList.setSelection(proxies)
+
+    @Slot(object)
+    def onListSelectionChanged(self, objects: List[OverlayListWidgetItem]):
+
+        proxies = [proxy for proxy in map(self.getProxy, objects) if proxy is not None]
+
+        self.showProperties(proxies[0] if len(proxies) == 1 else None)
+        self.overlayFrame.setSelection(proxies)
 
     def closeEvent(self, event: QCloseEvent):
         
-        overlay.showFullScreen()
+        self.overlay.showFullScreen()
         super().closeEvent(event)
 
+class ElayvateApplication(QApplication):
+
+    def __init__(self, argv: List[str], args: argparse.Namespace, profiler: StartupProfiler):
+
+        super().__init__(argv)
+        self.args = args
+        self.profiler = profiler
+        self.settings = QSettings('Elayvate', 'Elayvate')
+        self.overlay = None
+        self.window = None
+        self.binder = None
+        self.control = None
+
+    def start(self):
+
+        OverlayUpdateScheduler.instance().setMaxRate(environmentNumber('ELAYVATE_OVERLAY_MAX_FPS'))
+        self.setStyleSheet(Style.QApplication)
+
+        self.overlay = ElayvateOverlay()
+        self.overlay.editorRequested.connect(self.openEditor)
+        self.overlay.showFullScreen()
+        self.processEvents()
+        self.profiler.mark('overlay ready')
+
+        # The editor and last layout come after the overlay's first frame
+        QTimer.singleShot(0, self.createEditor)
+
+    def createEditor(self):
+
+        self.window = ElayvateWindow(overlay=self.overlay)
+        self.window.layoutChanged.connect(self.rememberLayout)
+
+        path = self.settings.value('lastLayout', '')
+        if path and os.path.exists(path):
+
+            try: self.window.loadLayout(path)
+            except Exception as e:
+
+                # A layout that cannot be opened must not keep the editor from ever starting
+                print('Last layout not loaded: {}'.format(e), file=sys.stderr)
+                self.settings.remove('lastLayout')
+
+        if self.args.bindings: self.startBindings(self.args.bindings)
+        if self.args.control: self.startControl(self.args.control)
+        if not self.args.overlay_only: self.openEditor()
+        self.profiler.mark('editor ready')
+        if self.args.profile_startup: self.profiler.report()
+
+    def startBindings(self, path: str):
+
+        # The asyncio side is only imported when a session actually asks for it
+        from Bindings import BindingError, DataBinder
+
+        self.binder = DataBinder(self.window.proxies)
+
+        try: self.binder.load(path)
+        except (OSError, BindingError) as e:
+
+            print('Bindings not loaded: {}'.format(e), file=sys.stderr)
+            return
+
+        self.window.layoutChanged.connect(self.binder.refresh)
+        self.startDataLoop()
+
+    def startControl(self, path: str):
+
+        from Control import ControlServer
+
+        self.control = ControlServer(self.window.proxies, path)
+        self.startDataLoop()
+        self.control.start()
+
+    def startDataLoop(self):
+
+        from DataSources import DataHub
+
+        # Sources and the control socket share one asyncio loop; the Qt loop only ever sees parsed values
+        hub = DataHub.instance()
+        if hub.isRunning(): return
+
+        self.aboutToQuit.connect(hub.stop)
+        hub.start()
+
+    def openEditor(self):
+
+        if self.window is None: self.createEditor()
+        self.window.show()
+        self.window.raise_()
+        self.window.activateWindow()
+
+    def rememberLayout(self, path: str):
+
+        self.settings.setValue('lastLayout', path)
+
+def parseArguments(argv: List[str]) -> argparse.Namespace:
+
+    parser = argparse.ArgumentParser(prog='Elayvate')
+    parser.add_argument('--overlay-only', action='store_true', help='show only the overlay; open the editor with Ctrl+E')
+    parser.add_argument('--bindings', metavar='FILE', help='bind item text, visibility or images to the data sources in this JSON file')
+    parser.add_argument('--control', nargs='?', const=defaultSocketPath(), metavar='SOCKET', help='accept batched item updates on a Unix socket (default {})'.format(defaultSocketPath()))
+    parser.add_argument('--profile-startup', action='store_true', help='print a per-phase startup timing breakdown')
+    args, _ = parser.parse_known_args(argv[1:])
+
+    return args
 
 if __name__ == '__main__':
 
-    app = QApplication([])
-    overlay = ElayvateOverlayWindow()
-    window = ElayvateWindow(overlay=overlay)
+    profiler = StartupProfiler(STARTED)
+    profiler.mark('imports')
+
+    args = parseArguments(sys.argv)
+    app = ElayvateApplication(sys.argv, args, profiler)
+    profiler.mark('QApplication')
 
-    app.setStyleSheet(Style.QApplication)
-    window.show()
+    app.start()
     sys.exit(app.exec())
\ No newline at end of file